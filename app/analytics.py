@@ -0,0 +1,237 @@
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .dimensions import country_name
+from .hll import HyperLogLog
+from .models import DeviceType, Link, LinkClick, LinkClickRollup, LinkDailyUniques
+
+
+def rollup_key(link_id, clicked_at, country_code, device_type):
+    if device_type is None:
+        device_type = DeviceType.UNKNOWN
+    return (link_id, timezone.localdate(clicked_at), country_code or '', device_type)
+
+
+def increment_rollups(clicks):
+    counts = Counter(
+        rollup_key(c.link_id, c.clicked_at, c.country_code, c.device_type) for c in clicks
+    )
+    if not counts:
+        return
+
+    # Make sure every row exists, then bump them with F() so concurrent
+    # flushers never overwrite each other's counts.
+    LinkClickRollup.objects.bulk_create(
+        [
+            LinkClickRollup(link_id=link_id, date=date, country_code=code, device_type=device_type)
+            for link_id, date, code, device_type in counts
+        ],
+        ignore_conflicts=True,
+    )
+    for (link_id, date, code, device_type), count in counts.items():
+        LinkClickRollup.objects.filter(
+            link_id=link_id, date=date, country_code=code, device_type=device_type
+        ).update(count=F('count') + count)
+
+
+def visitor_key(ip_address, user_agent_id):
+    # Anonymized IP plus User-Agent: the same identity the raw clicks can
+    # reproduce, so rebuilt sketches match the ones kept at ingestion.
+    return f'{ip_address or ""}|{user_agent_id or ""}'
+
+
+def increment_daily_uniques(clicks):
+    sketches = defaultdict(HyperLogLog)
+    for c in clicks:
+        key = (c.link_id, timezone.localdate(c.clicked_at))
+        sketches[key].add(visitor_key(c.ip_address, c.user_agent_id))
+    if not sketches:
+        return
+
+    # Same pattern as the rollups: create missing rows, then merge into locked
+    # rows so concurrent flushers can't lose each other's registers. Locking
+    # in primary key order keeps two flushers from deadlocking.
+    empty = HyperLogLog().to_bytes()
+    LinkDailyUniques.objects.bulk_create(
+        [LinkDailyUniques(link_id=link_id, date=date, sketch=empty) for link_id, date in sketches],
+        ignore_conflicts=True,
+    )
+    rows = LinkDailyUniques.objects.select_for_update().filter(
+        link_id__in={link_id for link_id, _ in sketches},
+        date__in={date for _, date in sketches},
+    ).order_by('pk')
+    updated = []
+    for row in rows:
+        sketch = sketches.get((row.link_id, row.date))
+        if sketch is not None:
+            row.sketch = sketch.merge(HyperLogLog.from_bytes(row.sketch)).to_bytes()
+            updated.append(row)
+    LinkDailyUniques.objects.bulk_update(updated, ['sketch'])
+
+
+def rebuild_daily_uniques(link):
+    sketches = defaultdict(HyperLogLog)
+    rows = (
+        LinkClick.objects.filter(link=link)
+        .values_list('clicked_at', 'ip_address', 'user_agent_id')
+        .iterator(chunk_size=5000)
+    )
+    for clicked_at, ip_address, user_agent_id in rows:
+        sketches[timezone.localdate(clicked_at)].add(visitor_key(ip_address, user_agent_id))
+
+    with transaction.atomic():
+        LinkDailyUniques.objects.filter(link=link).delete()
+        LinkDailyUniques.objects.bulk_create(
+            [
+                LinkDailyUniques(link=link, date=date, sketch=sketch.to_bytes())
+                for date, sketch in sketches.items()
+            ],
+            batch_size=1000,
+        )
+    return len(sketches)
+
+
+def rebuild_rollups(link):
+    # Raw clicks of sampled links carry a weight, so counts rebuilt from them
+    # are estimates rather than the exact counts kept during ingestion.
+    rows = (
+        LinkClick.objects.filter(link=link)
+        .annotate(date=TruncDate('clicked_at'))
+        .values('date', 'country_code', 'device_type')
+        .annotate(count=Sum('weight'))
+        .order_by()
+    )
+    # NULL and Unknown device types share a rollup row, so merge before inserting.
+    merged = Counter()
+    for row in rows:
+        device_type = DeviceType.UNKNOWN if row['device_type'] is None else row['device_type']
+        merged[(row['date'], row['country_code'], device_type)] += row['count']
+
+    with transaction.atomic():
+        LinkClickRollup.objects.filter(link=link).delete()
+        LinkClickRollup.objects.bulk_create(
+            [
+                LinkClickRollup(
+                    link=link, date=date, country_code=code, device_type=device_type, count=count
+                )
+                for (date, code, device_type), count in merged.items()
+            ],
+            batch_size=1000,
+        )
+    return len(merged)
+
+
+def rollups_by_day(rollups, days=30):
+    since = timezone.localdate() - timedelta(days=days)
+    return list(
+        rollups.filter(date__gte=since)
+        .values('date')
+        .annotate(count=Sum('count'))
+        .order_by('date')
+    )
+
+
+def rollups_by_country(rollups):
+    rows = (
+        rollups.exclude(country_code='')
+        .values('country_code')
+        .annotate(count=Sum('count'))
+        .order_by('-count')
+    )
+    return [{'country': country_name(row['country_code']), 'count': row['count']} for row in rows]
+
+
+def rollups_by_device(rollups):
+    rows = (
+        rollups.values('device_type')
+        .annotate(count=Sum('count'))
+        .order_by('-count')
+    )
+    return [{'device_type': DeviceType(row['device_type']).label, 'count': row['count']} for row in rows]
+
+
+def clicks_by_day(link, days=30):
+    return rollups_by_day(LinkClickRollup.objects.filter(link=link), days)
+
+
+def clicks_by_country(link):
+    return rollups_by_country(LinkClickRollup.objects.filter(link=link))
+
+
+def clicks_by_device(link):
+    return rollups_by_device(LinkClickRollup.objects.filter(link=link))
+
+
+def unique_visitors(link, days=30):
+    """Daily unique visitor estimates and the merged estimate for the whole range."""
+    since = timezone.localdate() - timedelta(days=days)
+    rows = (
+        LinkDailyUniques.objects.filter(link=link, date__gte=since)
+        .values_list('date', 'sketch')
+        .order_by('date')
+    )
+    total = HyperLogLog()
+    by_day = []
+    for date, data in rows:
+        sketch = HyperLogLog.from_bytes(data)
+        by_day.append({'date': date, 'count': sketch.count()})
+        total.merge(sketch)
+    return by_day, total.count()
+
+
+def get_summary_cache():
+    return caches[settings.ANALYTICS_SUMMARY['ALIAS']]
+
+
+def summary_generation_key(owner_id):
+    return f'analytics:summary:gen:{owner_id or "anon"}'
+
+
+def invalidate_account_summaries(owner_ids):
+    # Cached summaries are keyed by the owner's generation, so moving it on
+    # orphans every cached variant (days, top) at once.
+    stamp = time.time_ns()
+    get_summary_cache().set_many(
+        {summary_generation_key(owner_id): stamp for owner_id in owner_ids}, None
+    )
+
+
+def build_account_summary(owner_id, days=30, top=10):
+    links = Link.objects.filter(created_by_id=owner_id)
+    rollups = LinkClickRollup.objects.filter(link__created_by_id=owner_id)
+    totals = links.aggregate(
+        total_links=Count('id'),
+        total_clicks=Sum('click_count', default=0),
+        bot_clicks=Sum('bot_click_count', default=0),
+    )
+    top_links = list(
+        links.order_by('-click_count', '-id')
+        .values('short_code', 'long_url', 'title', 'click_count')[:top]
+    )
+    return {
+        **totals,
+        'top_links': top_links,
+        'clicks_by_day': rollups_by_day(rollups, days),
+        'clicks_by_country': rollups_by_country(rollups),
+        'clicks_by_device': rollups_by_device(rollups),
+    }
+
+
+def account_summary(owner_id, days=30, top=10):
+    """Dashboard totals over all of an owner's links, in five grouped queries."""
+    cache = get_summary_cache()
+    generation = cache.get(summary_generation_key(owner_id), 0)
+    key = f'analytics:summary:{owner_id or "anon"}:{generation}:{days}:{top}'
+    summary = cache.get(key)
+    if summary is None:
+        summary = build_account_summary(owner_id, days, top)
+        cache.set(key, summary, settings.ANALYTICS_SUMMARY['TTL'])
+    return summary
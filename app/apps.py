@@ -3,4 +3,7 @@ from django.apps import AppConfig
 
 class AppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'app'
\ No newline at end of file
+    name = 'app'
+
+    def ready(self):
+        from . import signals  # noqa: F401
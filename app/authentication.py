@@ -0,0 +1,114 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.utils.translation import gettext_lazy as _
+from rest_framework_api_key.permissions import HasAPIKey
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+def get_auth_cache():
+    return caches[settings.AUTH_CACHE['ALIAS']]
+
+
+def api_key_cache_key(prefix):
+    return f'auth:apikey:v1:{prefix}'
+
+
+def user_cache_key(user_id):
+    return f'auth:user:v2:{user_id}'
+
+
+def invalidate_api_key(prefix):
+    get_auth_cache().delete(api_key_cache_key(prefix))
+
+
+def invalidate_user(user_id):
+    get_auth_cache().delete(user_cache_key(user_id))
+
+
+class CachedHasAPIKey(HasAPIKey):
+    """
+    HasAPIKey that remembers keys it has already verified.
+
+    Checking a key runs the password hasher, which is deliberately slow. Once a
+    key passes, a SHA-256 digest of it is cached under the key's prefix (prefixes
+    are unique per key), so later requests only compare digests. Saving or
+    deleting the APIKey drops the entry, see app.signals.
+    """
+
+    def has_permission(self, request, view):
+        key = self.get_key(request)
+        if not key:
+            return False
+
+        prefix = key.partition('.')[0]
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        cache = get_auth_cache()
+        cached = cache.get(api_key_cache_key(prefix))
+        if cached is not None and constant_time_compare(cached, digest):
+            return True
+
+        try:
+            api_key = self.model.objects.get_from_key(key)
+        except self.model.DoesNotExist:
+            return False
+        if api_key.has_expired:
+            return False
+
+        timeout = settings.AUTH_CACHE['API_KEY_TTL']
+        if api_key.expiry_date:
+            timeout = min(timeout, (api_key.expiry_date - timezone.now()).total_seconds())
+        if timeout > 0:
+            cache.set(api_key_cache_key(prefix), digest, timeout)
+        return True
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that caches what it needs of the user row for a short time.
+
+    The token itself is still verified on every request; only the user lookup is
+    cached. The entry holds the primary key, ``is_active`` and the MD5 digest of
+    the password hash that simplejwt compares revocation claims against, never
+    the row itself. Cache hits return a user with every other field deferred.
+    Saving or deleting the user drops the entry, see app.signals.
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        timeout = settings.AUTH_CACHE['USER_TTL']
+        if user_id is None or timeout <= 0:
+            return super().get_user(validated_token)
+
+        cache = get_auth_cache()
+        key = user_cache_key(user_id)
+        entry = cache.get(key)
+        if entry is None:
+            user = super().get_user(validated_token)
+            cache.set(key, (user.pk, user.is_active, get_md5_hash_password(user.password)), timeout)
+            return user
+
+        # Same checks as JWTAuthentication.get_user, against the cached entry.
+        pk, is_active, password_digest = entry
+        if api_settings.CHECK_USER_IS_ACTIVE and not is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != password_digest:
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+        return self.build_user(pk, is_active)
+
+    def build_user(self, pk, is_active):
+        # Deferred fields are loaded from the database if a view reads them.
+        values = {self.user_model._meta.pk.attname: pk, 'is_active': is_active}
+        field_names = [
+            field.attname for field in self.user_model._meta.concrete_fields if field.attname in values
+        ]
+        return self.user_model.from_db(None, field_names, [values[name] for name in field_names])
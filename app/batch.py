@@ -0,0 +1,177 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from .analytics import invalidate_account_summaries
+from .cache import link_cache
+from .models import Link
+from .redirects import purge_link_caches
+from .serializers import BatchOperationSerializer, LinkSerializer
+from .shortcodes import get_short_code_generator
+from .utils import url_hash
+
+LINK_NOT_FOUND_MESSAGE = "No Link matches the given short code."
+
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def allocate_short_codes(count):
+    """
+    Returns ``count`` distinct short codes not used by any link yet.
+
+    Candidates are generated in one go and checked with a single query per
+    round; only the ones that collide are regenerated.
+    """
+    generator = get_short_code_generator()
+    codes = set()
+    for _ in range(settings.SHORT_CODE_GENERATOR['MAX_RETRIES']):
+        missing = count - len(codes)
+        if not missing:
+            break
+        candidates = set(generator.generate_many(missing)) - codes
+        taken = set(
+            Link.objects.filter(short_code__in=candidates).order_by().values_list('short_code', flat=True)
+        )
+        codes |= candidates - taken
+    if len(codes) < count:
+        raise IntegrityError(f"Could not allocate {count} unique short codes")
+    return list(codes)
+
+
+class LinkBatch:
+    """
+    Runs a list of create/deactivate/extend/delete operations for one caller.
+
+    Operations are validated up front, then applied in chunks of
+    LINK_BATCH['CHUNK_SIZE'] with one transaction and a handful of queries per
+    chunk. ``run`` returns one result per operation, in request order; a
+    failing operation never affects the others.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.user = request.user if request.user.is_authenticated else None
+        self.chunk_size = settings.LINK_BATCH['CHUNK_SIZE']
+        self.results = []
+
+    def run(self, operations):
+        self.results = [None] * len(operations)
+        creates = []
+        mutations = defaultdict(list)
+        seen = set()
+        for index, item in enumerate(operations):
+            serializer = BatchOperationSerializer(data=item)
+            if not serializer.is_valid():
+                self.fail(index, item.get('op') if isinstance(item, dict) else None, serializer.errors)
+                continue
+            op = serializer.validated_data['op']
+            if op == 'create':
+                link_serializer = LinkSerializer(data=item, context={'request': self.request})
+                if link_serializer.is_valid():
+                    creates.append((index, link_serializer.validated_data))
+                else:
+                    self.fail(index, op, link_serializer.errors)
+                continue
+            short_code = serializer.validated_data['short_code']
+            if short_code in seen:
+                self.fail(index, op, {'short_code': ["Only one operation per short code is allowed."]})
+                continue
+            seen.add(short_code)
+            mutations[op].append((index, serializer.validated_data))
+
+        for chunk in chunked(creates, self.chunk_size):
+            self.create(chunk)
+        for op, items in mutations.items():
+            for chunk in chunked(items, self.chunk_size):
+                self.mutate(op, chunk)
+
+        if creates or mutations:
+            invalidate_account_summaries([self.user.id if self.user else None])
+        return self.results
+
+    def fail(self, index, op, errors):
+        self.results[index] = {'index': index, 'op': op, 'status': 'error', 'errors': errors}
+
+    def succeed(self, index, op, link, status):
+        self.results[index] = {
+            'index': index, 'op': op, 'status': status,
+            'short_code': link.short_code,
+            'short_url': self.request.build_absolute_uri(f'/r/{link.short_code}/'),
+        }
+
+    def create(self, chunk):
+        links = [Link(created_by=self.user, **data) for _, data in chunk]
+        # bulk_create skips Link.save(), so apply its defaults here.
+        default_expiry = timezone.now() + timedelta(days=30)
+        for link in links:
+            link.url_hash = url_hash(link.long_url)
+            if not link.expires_at:
+                link.expires_at = default_expiry
+        # Codes are checked against the table before the insert; a code taken
+        # in between fails the whole chunk, which is retried with fresh codes.
+        for _ in range(settings.SHORT_CODE_GENERATOR['MAX_RETRIES']):
+            for link, code in zip(links, allocate_short_codes(len(links))):
+                link.short_code = code
+            try:
+                with transaction.atomic():
+                    Link.objects.bulk_create(links)
+                break
+            except IntegrityError:
+                continue
+        else:
+            for index, _ in chunk:
+                self.fail(index, 'create', {'short_code': ["Could not allocate a unique short code."]})
+            return
+        # A redirect probed before the insert may have cached the code as missing.
+        link_cache.invalidate(*(link.short_code for link in links))
+        for (index, _), link in zip(chunk, links):
+            self.succeed(index, 'create', link, 'created')
+
+    def mutate(self, op, chunk):
+        codes = [data['short_code'] for _, data in chunk]
+        with transaction.atomic():
+            # Same rule as IsOwnerOrReadOnly: only the creator may change a
+            # link, so callers without a user can only create.
+            owned = {}
+            if self.user is not None:
+                owned = {
+                    link.short_code: link
+                    for link in Link.objects.filter(short_code__in=codes, created_by=self.user)
+                    .order_by().only('id', 'short_code')
+                }
+            found = [(index, data) for index, data in chunk if data['short_code'] in owned]
+            ids = [owned[data['short_code']].id for _, data in found]
+            now = timezone.now()
+            if op == 'deactivate':
+                Link.objects.filter(id__in=ids).update(is_active=False, swept_at=None, updated_at=now)
+            elif op == 'delete':
+                Link.objects.filter(id__in=ids).delete()
+            elif op == 'extend':
+                by_expiry = defaultdict(list)
+                for _, data in found:
+                    by_expiry[data['expires_at']].append(owned[data['short_code']].id)
+                for expires_at, expiry_ids in by_expiry.items():
+                    # Links the expiry sweeper deactivated come back to life.
+                    # is_active has to come before swept_at: MySQL applies the
+                    # assignments left to right, so the CASE would otherwise
+                    # see the swept_at that was just cleared.
+                    Link.objects.filter(id__in=expiry_ids).update(
+                        is_active=Case(When(swept_at__isnull=False, then=Value(True)), default=F('is_active')),
+                        expires_at=expires_at, updated_at=now, swept_at=None,
+                    )
+        if owned:
+            purge_link_caches(*owned)
+
+        for index, data in chunk:
+            link = owned.get(data['short_code'])
+            if link is None:
+                self.fail(index, op, {'short_code': [LINK_NOT_FOUND_MESSAGE]})
+            else:
+                self.succeed(index, op, link, 'deleted' if op == 'delete' else 'updated')
@@ -0,0 +1,186 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from .models import Link
+
+
+class ResolvedLink(namedtuple('ResolvedLink', [
+    'long_url', 'is_active', 'expires_at', 'id', 'redirect_policy', 'redirect_max_age',
+])):
+    __slots__ = ()
+
+    def is_expired(self):
+        if self.expires_at:
+            return timezone.now() > self.expires_at
+        return False
+
+
+# Stored for short codes that don't exist, so repeated misses stay off the database.
+NEGATIVE = 'missing'
+
+
+class LocalLRU:
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class LinkResolutionCache:
+    """
+    Maps short codes to the fields needed to serve a redirect.
+
+    Lookups go through a small per-process LRU, then the shared Django cache,
+    then the database. The local tier has a short TTL because invalidations
+    only reach the process that performed them.
+    """
+
+    key_prefix = 'link:resolve:v2:'
+
+    def __init__(self):
+        conf = settings.LINK_RESOLUTION_CACHE
+        self.alias = conf['ALIAS']
+        self.ttl = conf['TTL']
+        self.negative_ttl = conf['NEGATIVE_TTL']
+        self.local = LocalLRU(conf['LOCAL_MAXSIZE'], conf['LOCAL_TTL'])
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def make_key(self, short_code):
+        return self.key_prefix + short_code
+
+    def resolve(self, short_code):
+        entry = self.local.get(short_code)
+        if entry is not None:
+            self.local_hits += 1
+        else:
+            key = self.make_key(short_code)
+            entry = self.shared.get(key)
+            if entry is not None:
+                self.shared_hits += 1
+            else:
+                self.misses += 1
+                entry = self.load(short_code)
+                self.shared.set(key, entry, self.timeout_for(entry))
+            self.local.set(short_code, entry)
+        return self.to_link(entry)
+
+    async def aresolve(self, short_code):
+        entry = self.local.get(short_code)
+        if entry is not None:
+            self.local_hits += 1
+        else:
+            key = self.make_key(short_code)
+            entry = await self.shared.aget(key)
+            if entry is not None:
+                self.shared_hits += 1
+            else:
+                self.misses += 1
+                entry = await self.aload(short_code)
+                await self.shared.aset(key, entry, self.timeout_for(entry))
+            self.local.set(short_code, entry)
+        return self.to_link(entry)
+
+    def timeout_for(self, entry):
+        return self.negative_ttl if entry == NEGATIVE else self.ttl
+
+    def to_link(self, entry):
+        if entry == NEGATIVE:
+            self.negative_hits += 1
+            return None
+        return ResolvedLink(*entry)
+
+    def lookup_queryset(self, short_code):
+        return (
+            Link.objects.filter(short_code=short_code)
+            .values_list(*ResolvedLink._fields)
+        )
+
+    def load(self, short_code):
+        queryset = self.lookup_queryset(short_code)
+        queryset = queryset.using(queryset.db)
+        row = queryset.first()
+        # A miss on a replica may only be replication lag (the link was just
+        # created), so it is confirmed on the primary before NEGATIVE is cached.
+        if row is None and queryset.db != DEFAULT_DB_ALIAS:
+            row = queryset.using(DEFAULT_DB_ALIAS).first()
+        return NEGATIVE if row is None else tuple(row)
+
+    async def aload(self, short_code):
+        queryset = self.lookup_queryset(short_code)
+        queryset = queryset.using(queryset.db)
+        row = await queryset.afirst()
+        if row is None and queryset.db != DEFAULT_DB_ALIAS:
+            row = await queryset.using(DEFAULT_DB_ALIAS).afirst()
+        return NEGATIVE if row is None else tuple(row)
+
+    def invalidate(self, *short_codes):
+        for short_code in short_codes:
+            self.local.delete(short_code)
+        self.shared.delete_many([self.make_key(code) for code in short_codes])
+
+    def clear(self):
+        self.local.clear()
+
+    def stats(self):
+        hits = self.local_hits + self.shared_hits
+        lookups = hits + self.misses
+        return {
+            'local_hits': self.local_hits,
+            'shared_hits': self.shared_hits,
+            'misses': self.misses,
+            'negative_hits': self.negative_hits,
+            'evictions': self.local.evictions,
+            'local_size': len(self.local),
+            'hit_rate': hits / lookups if lookups else 0.0,
+        }
+
+
+link_cache = LinkResolutionCache()
@@ -0,0 +1,141 @@
+import hashlib
+from functools import lru_cache
+from urllib.parse import urlsplit
+
+import pycountry
+from django.conf import settings
+from django.db import transaction
+
+from .cache import LocalLRU
+from .models import DeviceType, Referrer, UserAgent
+
+# Longest referrer kept, as enforced by the old LinkClick.referrer column.
+REFERRER_MAX_LENGTH = 2000
+
+# GeoIP's English names where they differ from pycountry's, so the API keeps
+# returning the names clicks used to be stored with.
+GEOIP_COUNTRY_NAMES = {
+    'BN': 'Brunei',
+    'BQ': 'Bonaire, Sint Eustatius, and Saba',
+    'CD': 'DR Congo',
+    'CG': 'Congo Republic',
+    'CI': 'Ivory Coast',
+    'FK': 'Falkland Islands',
+    'FM': 'Federated States of Micronesia',
+    'JO': 'Hashemite Kingdom of Jordan',
+    'KN': 'St Kitts and Nevis',
+    'MF': 'Saint Martin',
+    'MO': 'Macao',
+    'NL': 'The Netherlands',
+    'PN': 'Pitcairn Islands',
+    'PS': 'Palestine',
+    'RU': 'Russia',
+    'SX': 'Sint Maarten',
+    'UM': 'U.S. Minor Outlying Islands',
+    'VA': 'Vatican City',
+    'VC': 'St Vincent and Grenadines',
+    'VG': 'British Virgin Islands',
+    'VI': 'U.S. Virgin Islands',
+    'XK': 'Kosovo',
+}
+_GEOIP_COUNTRY_CODES = {name: code for code, name in GEOIP_COUNTRY_NAMES.items()}
+
+DEVICE_TYPES_BY_LABEL = {label: value for value, label in DeviceType.choices}
+
+
+@lru_cache(maxsize=None)
+def country_name(code):
+    if not code:
+        return None
+    if code in GEOIP_COUNTRY_NAMES:
+        return GEOIP_COUNTRY_NAMES[code]
+    country = pycountry.countries.get(alpha_2=code)
+    if country is None:
+        return code
+    return getattr(country, 'common_name', None) or country.name
+
+
+@lru_cache(maxsize=None)
+def country_code(name):
+    if not name:
+        return ''
+    if name in _GEOIP_COUNTRY_CODES:
+        return _GEOIP_COUNTRY_CODES[name]
+    try:
+        return pycountry.countries.lookup(name).alpha_2
+    except LookupError:
+        return ''
+
+
+def device_type_for(label):
+    return DEVICE_TYPES_BY_LABEL.get(label, DeviceType.UNKNOWN)
+
+
+def dimension_hash(value):
+    return hashlib.blake2b(value.encode(), digest_size=16).hexdigest()
+
+
+def referrer_host(url):
+    try:
+        return (urlsplit(url).hostname or '')[:255]
+    except ValueError:
+        return ''
+
+
+class DimensionTable:
+    """
+    Maps distinct strings to the ids of their rows in a deduplicated table.
+
+    Missing rows are inserted with ``ignore_conflicts`` so concurrent flushers
+    can race safely. Ids are remembered in a process-local LRU, but only after
+    the transaction that looked them up commits, so a rollback never leaves ids
+    of rows that don't exist in the cache.
+    """
+
+    def __init__(self, model, build):
+        self.model = model
+        self.build = build
+        self.local = LocalLRU(settings.CLICK_INGEST['DIMENSION_CACHE_SIZE'], ttl=3600)
+
+    def resolve(self, values):
+        ids = {}
+        missing = {}
+        for value in set(values):
+            if not value:
+                continue
+            pk = self.local.get(value)
+            if pk is None:
+                missing[dimension_hash(value)] = value
+            else:
+                ids[value] = pk
+        if not missing:
+            return ids
+
+        found = dict(self.model.objects.filter(hash__in=missing).values_list('hash', 'id'))
+        new = [self.build(value, digest) for digest, value in missing.items() if digest not in found]
+        if new:
+            self.model.objects.bulk_create(new, ignore_conflicts=True)
+            found.update(
+                self.model.objects.filter(hash__in=[row.hash for row in new]).values_list('hash', 'id')
+            )
+
+        resolved = {missing[digest]: pk for digest, pk in found.items()}
+        transaction.on_commit(lambda: self.remember(resolved))
+        ids.update(resolved)
+        return ids
+
+    def remember(self, resolved):
+        for value, pk in resolved.items():
+            self.local.set(value, pk)
+
+
+def build_user_agent(value, digest):
+    return UserAgent(hash=digest, value=value)
+
+
+def build_referrer(value, digest):
+    return Referrer(hash=digest, url=value, host=referrer_host(value))
+
+
+user_agents = DimensionTable(UserAgent, build_user_agent)
+referrers = DimensionTable(Referrer, build_referrer)
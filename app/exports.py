@@ -0,0 +1,184 @@
+import csv
+import gzip
+import io
+import json
+import sys
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+
+from django.db.models import Q
+
+from .dimensions import country_name
+from .models import DeviceType
+
+CLICK_EXPORT_FIELDS = [
+    'clicked_at', 'ip_address', 'user_agent', 'referrer', 'country', 'device_type', 'weight',
+]
+# Columns read for each of CLICK_EXPORT_FIELDS; iter_click_rows() turns them
+# back into the exported values.
+CLICK_EXPORT_COLUMNS = [
+    'clicked_at', 'ip_address', 'user_agent__value', 'referrer__url', 'country_code', 'device_type', 'weight',
+]
+
+LINK_EXPORT_FIELDS = [
+    'short_code', 'long_url', 'title', 'created_by', 'created_at', 'expires_at', 'is_active',
+    'click_count', 'bot_click_count', 'redirect_policy', 'redirect_max_age',
+]
+# Owners are exported by username, so a dump can be loaded into another database.
+LINK_EXPORT_COLUMNS = [
+    'short_code', 'long_url', 'title', 'created_by__username', 'created_at', 'expires_at', 'is_active',
+    'click_count', 'bot_click_count', 'redirect_policy', 'redirect_max_age',
+]
+
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def keyset_after(key, values):
+    """Q matching rows that sort after ``values`` in ascending ``key`` order."""
+    condition = Q()
+    for position, field in enumerate(key):
+        equal = {name: value for name, value in zip(key[:position], values)}
+        condition |= Q(**equal, **{f'{field}__gt': values[position]})
+    return condition
+
+
+def iter_keyset(queryset, columns, chunk_size, key=('id',)):
+    """
+    Rows of ``queryset.values_list(*columns)`` in ascending ``key`` order, read
+    ``chunk_size`` at a time with one range query per batch.
+
+    Unlike ``.iterator()`` memory stays flat on MySQL too, where the driver's
+    default cursor buffers the whole result set client-side.
+    """
+    queryset = queryset.order_by(*key).values_list(*key, *columns)
+    width = len(key)
+    last = None
+    while True:
+        batch = list((queryset if last is None else queryset.filter(keyset_after(key, last)))[:chunk_size])
+        for row in batch:
+            yield row[width:]
+        if len(batch) < chunk_size:
+            return
+        last = batch[-1][:width]
+
+
+def iter_click_rows(rows):
+    # Leading extra columns (e.g. the link's short code) pass through untouched.
+    labels = dict(DeviceType.choices)
+    for *extra, clicked_at, ip_address, user_agent, referrer, code, device_type, weight in rows:
+        yield (
+            *extra, clicked_at, ip_address, user_agent or '', referrer or '',
+            country_name(code), labels.get(device_type), weight,
+        )
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def _plain(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def iter_csv(rows, fields):
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([_plain(value) for value in row])
+
+
+def iter_ndjson(rows, fields):
+    for row in rows:
+        yield json.dumps(
+            {name: _plain(value) for name, value in zip(fields, row)},
+            separators=(',', ':'),
+        ) + '\n'
+
+
+EXPORT_WRITERS = {
+    'csv': iter_csv,
+    'ndjson': iter_ndjson,
+}
+
+
+def iter_export(fmt, rows, fields):
+    return EXPORT_WRITERS[fmt](rows, fields)
+
+
+def iter_csv_records(stream):
+    return csv.DictReader(stream)
+
+
+def iter_ndjson_records(stream):
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+IMPORT_READERS = {
+    'csv': iter_csv_records,
+    'ndjson': iter_ndjson_records,
+}
+
+
+@contextmanager
+def open_stream(path, mode='r', compress=None):
+    """
+    Text stream over ``path`` (``-`` for stdin/stdout), gzip-compressed when
+    ``compress`` is set or, by default, when the name ends in ``.gz``.
+    """
+    if compress is None:
+        compress = path.endswith('.gz')
+    if path == '-':
+        raw, owned = (sys.stdin.buffer if mode == 'r' else sys.stdout.buffer), None
+    else:
+        raw = owned = open(path, mode + 'b')
+    compressed = gzip.GzipFile(fileobj=raw, mode=mode + 'b') if compress else None
+    stream = io.TextIOWrapper(compressed or raw, encoding='utf-8', newline='')
+    try:
+        yield stream
+    finally:
+        if mode != 'r':
+            stream.flush()
+        stream.detach()
+        if compressed is not None:
+            compressed.close()
+        if owned is not None:
+            owned.close()
+        elif mode != 'r':
+            raw.flush()
+
+
+class Progress:
+    """Counts rows and reports the running total and rate every ``every`` rows."""
+
+    def __init__(self, stream, label, every=100000):
+        self.stream = stream
+        self.label = label
+        self.every = every
+        self.count = 0
+        self.next_report = every
+        self.started = time.monotonic()
+
+    def add(self, count=1):
+        self.count += count
+        if self.every and self.count >= self.next_report:
+            self.next_report = (self.count // self.every + 1) * self.every
+            self.stream.write(self.summary())
+
+    def track(self, rows):
+        for row in rows:
+            yield row
+            self.add()
+
+    def summary(self):
+        elapsed = time.monotonic() - self.started
+        rate = self.count / elapsed if elapsed else 0
+        return f"{self.label}: {self.count:,} rows in {elapsed:.1f}s ({rate:,.0f} rows/s)"
@@ -0,0 +1,280 @@
+import atexit
+import logging
+import math
+import os
+import queue
+import threading
+import time
+from collections import Counter, defaultdict, namedtuple
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .analytics import increment_daily_uniques, increment_rollups, invalidate_account_summaries
+from .dimensions import REFERRER_MAX_LENGTH, device_type_for, referrers, user_agents
+from .metrics import CLICKS_DROPPED
+from .models import Link, LinkClick
+from .utils import anonymize_ip, classify_user_agent, get_country_code_from_ip
+
+logger = logging.getLogger(__name__)
+
+# Raw request data only; UA parsing, GeoIP and IP anonymization happen when
+# the record is written, off the response path.
+ClickRecord = namedtuple('ClickRecord', [
+    'link_id', 'clicked_at', 'ip_address', 'user_agent', 'referrer',
+])
+
+
+def build_click(record, user_agent_class=None, user_agent_id=None, referrer_id=None):
+    if user_agent_class is None:
+        user_agent_class = classify_user_agent(record.user_agent)
+    return LinkClick(
+        link_id=record.link_id,
+        clicked_at=record.clicked_at,
+        ip_address=anonymize_ip(record.ip_address),
+        user_agent_id=user_agent_id,
+        referrer_id=referrer_id,
+        country_code=get_country_code_from_ip(record.ip_address) or '',
+        device_type=device_type_for(user_agent_class.device_type),
+    )
+
+
+def truncate_referrer(referrer):
+    return (referrer or '')[:REFERRER_MAX_LENGTH]
+
+
+class ClickSampler:
+    """
+    Systematic 1/N sampling of stored click rows, per link.
+
+    N is chosen at the start of each ``WINDOW`` from the link's click count in
+    the previous window: links above ``THRESHOLD`` clicks keep about ``BUDGET``
+    rows per window, each carrying ``weight=N`` so weighted sums stay unbiased.
+    Counts are per process, which is fine because every process samples its own
+    share of the traffic.
+    """
+
+    def __init__(self):
+        self._period = None
+        self._current = Counter()
+        self._rates = {}
+        self._seen = Counter()
+        self._lock = threading.Lock()
+
+    def rollover(self, period, threshold, budget):
+        previous = self._current if self._period is not None and period == self._period + 1 else {}
+        self._rates = {
+            link_id: math.ceil(count / budget)
+            for link_id, count in previous.items()
+            if count > threshold
+        }
+        self._period = period
+        self._current = Counter()
+        self._seen = Counter()
+
+    def sample(self, clicks):
+        conf = settings.CLICK_SAMPLING
+        if conf['THRESHOLD'] <= 0:
+            return clicks
+
+        period = int(time.monotonic() // conf['WINDOW'])
+        kept = []
+        with self._lock:
+            if period != self._period:
+                self.rollover(period, conf['THRESHOLD'], max(conf['BUDGET'], 1))
+            for click in clicks:
+                self._current[click.link_id] += 1
+                rate = self._rates.get(click.link_id, 1)
+                if rate > 1:
+                    self._seen[click.link_id] += 1
+                    if self._seen[click.link_id] % rate:
+                        continue
+                    click.weight = rate
+                kept.append(click)
+        return kept
+
+
+class ClickBuffer:
+    """
+    Collects clicks from the redirect path and writes them in batches.
+
+    In ``thread`` mode a daemon thread flushes every ``FLUSH_INTERVAL`` seconds;
+    whatever is left is flushed at interpreter exit. ``sync`` mode writes each
+    click immediately. ``manual`` buffers like ``thread`` but only flushes when
+    ``flush()`` is called, which keeps tests deterministic.
+
+    A redirect never fails or waits because clicks can't be written: when the
+    queue is full (the flusher is behind, or the database is down) or a
+    ``sync`` write fails, the click is dropped and counted in
+    ``urlshortener_clicks_dropped_total``.
+    """
+
+    # Seconds between two warnings about dropped clicks.
+    drop_log_interval = 60
+
+    def __init__(self):
+        conf = settings.CLICK_INGEST
+        self.batch_size = conf['BATCH_SIZE']
+        self.flush_interval = conf['FLUSH_INTERVAL']
+        self.max_queue = conf['MAX_QUEUE']
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._sampler = ClickSampler()
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._retry = []
+        self._flush_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._drop_logged_at = None
+
+    @property
+    def mode(self):
+        return settings.CLICK_INGEST['MODE']
+
+    def enqueue(self, record):
+        if self.mode == 'sync':
+            try:
+                self.write([record])
+            except Exception:
+                logger.exception("Click write failed")
+                self.drop('write_failed')
+            return
+
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.drop('queue_full')
+
+    def drop(self, reason):
+        CLICKS_DROPPED.inc(reason)
+        now = time.monotonic()
+        if self._drop_logged_at is None or now - self._drop_logged_at >= self.drop_log_interval:
+            self._drop_logged_at = now
+            logger.warning("Dropping redirect clicks (%s); see urlshortener_clicks_dropped_total", reason)
+
+    def offer(self, record):
+        # Non-blocking enqueue for async callers; False means the caller has to
+        # fall back to enqueue() in a thread (sync mode writes to the database).
+        if self.mode == 'sync':
+            return False
+        self.enqueue(record)
+        return True
+
+    def _ensure_worker(self):
+        if self._pid != os.getpid():
+            # Forked after the parent started buffering; the copied queue and
+            # thread belong to the parent.
+            self._reset()
+        if self._thread is not None or self.mode != 'thread':
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='click-flusher', daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Click flush failed; records kept for the next attempt")
+
+    def flush(self):
+        written = 0
+        with self._flush_lock:
+            while True:
+                batch, self._retry = self._retry, []
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if not batch:
+                    return written
+                try:
+                    self.write(batch)
+                except Exception:
+                    self._retry = batch
+                    raise
+                written += len(batch)
+
+    def write(self, records):
+        # BOT_POLICY: "store" treats bots like everyone else, "count" only adds
+        # them to Link.bot_click_count, "drop" discards them.
+        bot_policy = settings.CLICK_INGEST['BOT_POLICY']
+        humans = []
+        bot_clicks = Counter()
+        for record in records:
+            user_agent_class = classify_user_agent(record.user_agent)
+            if user_agent_class.is_bot and bot_policy != 'store':
+                if bot_policy == 'count':
+                    bot_clicks[record.link_id] += 1
+                continue
+            humans.append((record, user_agent_class))
+
+        with transaction.atomic():
+            owners = dict(
+                Link.objects.filter(id__in={record.link_id for record, _ in humans} | set(bot_clicks))
+                .values_list('id', 'created_by_id')
+            )
+            existing = set(owners)
+            # Links deleted since the click was recorded are skipped.
+            humans = [(record, ua) for record, ua in humans if record.link_id in existing]
+
+            user_agent_ids = user_agents.resolve(record.user_agent for record, _ in humans)
+            referrer_ids = referrers.resolve(truncate_referrer(record.referrer) for record, _ in humans)
+            clicks = [
+                build_click(
+                    record, user_agent_class,
+                    user_agent_ids.get(record.user_agent),
+                    referrer_ids.get(truncate_referrer(record.referrer)),
+                )
+                for record, user_agent_class in humans
+            ]
+            sampled = self._sampler.sample(clicks)
+            LinkClick.objects.bulk_create(sampled, batch_size=self.batch_size)
+
+            # click_count and the rollups stay exact; only raw rows are sampled.
+            human_clicks = Counter(click.link_id for click in clicks)
+            increments = defaultdict(list)
+            for link_id in existing:
+                counts = (human_clicks[link_id], bot_clicks[link_id])
+                if any(counts):
+                    increments[counts].append(link_id)
+            for (count, bot_count), ids in increments.items():
+                Link.objects.filter(id__in=ids).update(
+                    click_count=F('click_count') + count,
+                    bot_click_count=F('bot_click_count') + bot_count,
+                    updated_at=timezone.now(),
+                )
+
+            increment_rollups(clicks)
+            increment_daily_uniques(clicks)
+
+            clicked = {owners[link_id] for ids in increments.values() for link_id in ids}
+            if clicked:
+                transaction.on_commit(lambda: invalidate_account_summaries(clicked))
+
+    def shutdown(self):
+        self._stop.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout=self.flush_interval + 5)
+        try:
+            self.flush()
+        except Exception:
+            logger.exception(
+                "Dropping %d buffered clicks at shutdown", self._queue.qsize() + len(self._retry)
+            )
+
+
+click_buffer = ClickBuffer()
+atexit.register(click_buffer.shutdown)
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from app.exports import (
+    CLICK_EXPORT_COLUMNS, CLICK_EXPORT_FIELDS, EXPORT_WRITERS, Progress, iter_click_rows, iter_export,
+    iter_keyset, open_stream,
+)
+from app.models import LinkClick
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream raw clicks as CSV or NDJSON with the link's short code in the "
+        "first column. Raw clicks of busy links are samples; see the weight column."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'short_codes', nargs='*',
+            help="Only export clicks of these links (default: every link).",
+        )
+        parser.add_argument('--output', default='-', help="File to write (default: stdout).")
+        parser.add_argument('--format', choices=list(EXPORT_WRITERS), default='csv')
+        parser.add_argument(
+            '--gzip', action='store_true', default=None,
+            help="Compress the output (implied by an --output ending in .gz).",
+        )
+        parser.add_argument('--since', help="Only clicks at or after this ISO 8601 timestamp.")
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--progress-every', type=int, default=100000)
+
+    def handle(self, *args, **options):
+        clicks = LinkClick.objects.all()
+        if options['short_codes']:
+            clicks = clicks.filter(link__short_code__in=options['short_codes'])
+        if options['since']:
+            since = parse_datetime(options['since'])
+            if since is None:
+                raise CommandError(f"Invalid --since timestamp: {options['since']}")
+            clicks = clicks.filter(clicked_at__gte=since)
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be positive.")
+
+        rows = iter_keyset(clicks, ['link__short_code', *CLICK_EXPORT_COLUMNS], options['chunk_size'])
+        progress = Progress(self.stderr, 'Exported clicks', options['progress_every'])
+        with open_stream(options['output'], 'w', options['gzip']) as stream:
+            for chunk in iter_export(
+                options['format'], progress.track(iter_click_rows(rows)), ['short_code'] + CLICK_EXPORT_FIELDS
+            ):
+                stream.write(chunk)
+        self.stderr.write(self.style.SUCCESS(progress.summary()))
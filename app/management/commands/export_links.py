@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app.exports import (
+    EXPORT_WRITERS, LINK_EXPORT_COLUMNS, LINK_EXPORT_FIELDS, Progress, iter_export, iter_keyset, open_stream,
+)
+from app.models import Link
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream links as CSV or NDJSON, in the format import_links reads. "
+        "Progress goes to stderr, so the output can be piped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='-', help="File to write (default: stdout).")
+        parser.add_argument('--format', choices=list(EXPORT_WRITERS), default='csv')
+        parser.add_argument(
+            '--gzip', action='store_true', default=None,
+            help="Compress the output (implied by an --output ending in .gz).",
+        )
+        parser.add_argument('--owner', help="Only export links created by this username.")
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--progress-every', type=int, default=100000)
+
+    def handle(self, *args, **options):
+        links = Link.objects.all()
+        if options['owner']:
+            links = links.filter(created_by__username=options['owner'])
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be positive.")
+
+        rows = iter_keyset(links, LINK_EXPORT_COLUMNS, options['chunk_size'])
+        progress = Progress(self.stderr, 'Exported links', options['progress_every'])
+        with open_stream(options['output'], 'w', options['gzip']) as stream:
+            for chunk in iter_export(options['format'], progress.track(rows), LINK_EXPORT_FIELDS):
+                stream.write(chunk)
+        self.stderr.write(self.style.SUCCESS(progress.summary()))
@@ -0,0 +1,151 @@
+import itertools
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from app.batch import allocate_short_codes
+from app.cache import link_cache
+from app.exports import IMPORT_READERS, Progress, open_stream
+from app.models import Link
+from app.redirects import purge_link_caches
+from app.utils import url_hash
+
+# Columns read from each record; anything else is ignored. created_by holds a
+# username (see LINK_EXPORT_FIELDS).
+IMPORT_FIELDS = [
+    'short_code', 'long_url', 'title', 'created_at', 'expires_at', 'is_active',
+    'click_count', 'bot_click_count', 'redirect_policy', 'redirect_max_age',
+]
+# What --update overwrites on existing short codes. Owners, creation dates and
+# click counts stay as they are.
+UPDATE_FIELDS = [
+    'long_url', 'url_hash', 'title', 'expires_at', 'is_active', 'redirect_policy', 'redirect_max_age', 'updated_at',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Load links from CSV or NDJSON (as written by export_links) in chunks. "
+        "Existing short codes are skipped, or overwritten with --update; rows "
+        "without a short code get a new one."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help="File to read (default: stdin).")
+        parser.add_argument(
+            '--format', choices=list(IMPORT_READERS),
+            help="Input format (default: from the file name, else csv).",
+        )
+        parser.add_argument(
+            '--gzip', action='store_true', default=None,
+            help="Decompress the input (implied by a path ending in .gz).",
+        )
+        parser.add_argument('--update', action='store_true', help="Overwrite links whose short code exists.")
+        parser.add_argument('--owner', help="Username to own rows without a created_by value.")
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--progress-every', type=int, default=100000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('ndjson' if path.removesuffix('.gz').endswith('.ndjson') else 'csv')
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be positive.")
+
+        self.update = options['update']
+        self.owners = {}
+        self.default_owner = None
+        if options['owner']:
+            self.default_owner = self.owner_id(options['owner'])
+            if self.default_owner is None:
+                raise CommandError(f"Unknown user: {options['owner']}")
+
+        # Counts rows inserted, or inserted and updated with --update.
+        progress = Progress(self.stderr, 'Imported links', options['progress_every'])
+        self.skipped = 0
+        self.existing = 0
+        with open_stream(path, 'r', options['gzip']) as stream:
+            records = enumerate(IMPORT_READERS[fmt](stream), start=1)
+            while chunk := list(itertools.islice(records, options['chunk_size'])):
+                progress.add(self.import_chunk(chunk))
+
+        self.stderr.write(self.style.SUCCESS(progress.summary()))
+        if self.existing:
+            self.stderr.write(f"Skipped {self.existing} existing short codes (use --update to overwrite them).")
+        if self.skipped:
+            self.stderr.write(self.style.WARNING(f"Skipped {self.skipped} invalid rows."))
+
+    def owner_id(self, username):
+        if username not in self.owners:
+            self.owners[username] = User.objects.filter(username=username).values_list('id', flat=True).first()
+        return self.owners[username]
+
+    def load_owners(self, records):
+        usernames = {record.get('created_by') for _, record in records} - set(self.owners) - {None, ''}
+        if usernames:
+            found = dict(User.objects.filter(username__in=usernames).values_list('username', 'id'))
+            self.owners.update({username: found.get(username) for username in usernames})
+
+    def build_link(self, record):
+        values = {}
+        for name in IMPORT_FIELDS:
+            value = record.get(name)
+            if value == '' and name != 'long_url':
+                value = None
+            if value is None and name not in record:
+                continue
+            field = Link._meta.get_field(name)
+            if value is None and not field.null:
+                continue
+            values[name] = field.clean(value, None)
+        if not values.get('long_url', '').startswith(('http://', 'https://')):
+            raise ValidationError("long_url must start with http:// or https://")
+
+        username = record.get('created_by')
+        if username:
+            values['created_by_id'] = self.owners.get(username)
+            if values['created_by_id'] is None:
+                raise ValidationError(f"Unknown user: {username}")
+        else:
+            values['created_by_id'] = self.default_owner
+        return Link(url_hash=url_hash(values['long_url']), **values)
+
+    def import_chunk(self, records):
+        self.load_owners(records)
+        links = []
+        for line, record in records:
+            try:
+                links.append(self.build_link(record))
+            except ValidationError as error:
+                self.skipped += 1
+                self.stderr.write(f"Row {line}: {'; '.join(error.messages)}")
+
+        unnamed = [link for link in links if not link.short_code]
+        for link, short_code in zip(unnamed, allocate_short_codes(len(unnamed)) if unnamed else []):
+            link.short_code = short_code
+        # A short code listed twice in one chunk keeps its last row; a single
+        # upsert statement can't touch the same row twice.
+        links = list({link.short_code: link for link in links}.values())
+
+        codes = [link.short_code for link in links]
+        if self.update:
+            options = {'update_conflicts': True, 'update_fields': UPDATE_FIELDS}
+            if connection.features.supports_update_conflicts_with_target:
+                options['unique_fields'] = ['short_code']
+        else:
+            # Leave out codes that already exist, so the count is of rows
+            # actually inserted; ignore_conflicts only covers concurrent inserts.
+            existing = set(Link.objects.filter(short_code__in=codes).values_list('short_code', flat=True))
+            links = [link for link in links if link.short_code not in existing]
+            self.existing += len(existing)
+            options = {'ignore_conflicts': True}
+        with transaction.atomic():
+            Link.objects.bulk_create(links, **options)
+
+        # Existing codes may be cached (and new ones cached as missing).
+        if codes and self.update:
+            purge_link_caches(*codes)
+        elif links:
+            link_cache.invalidate(*(link.short_code for link in links))
+        return len(links)
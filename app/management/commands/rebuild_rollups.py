@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app.analytics import rebuild_rollups
+from app.models import Link
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-day click rollups from raw LinkClick rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'short_codes', nargs='*',
+            help="Only rebuild these links (default: every link).",
+        )
+
+    def handle(self, *args, **options):
+        links = Link.objects.only('id', 'short_code').order_by('id')
+        if options['short_codes']:
+            links = links.filter(short_code__in=options['short_codes'])
+            missing = set(options['short_codes']) - set(links.values_list('short_code', flat=True))
+            if missing:
+                raise CommandError(f"Unknown short codes: {', '.join(sorted(missing))}")
+
+        total_links = total_rows = 0
+        for link in links.iterator(chunk_size=500):
+            total_rows += rebuild_rollups(link)
+            total_links += 1
+            if options['verbosity'] >= 2:
+                self.stdout.write(f"{link.short_code}: rebuilt")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {total_rows} rollup rows for {total_links} links."
+        ))
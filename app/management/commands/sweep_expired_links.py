@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from app.models import Link
+from app.sweeper import sweep_expired_links
+
+
+class Command(BaseCommand):
+    help = (
+        "Deactivate active links whose expiry date has passed, in small "
+        "transactions. Safe to interrupt and to run from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, help="Links per transaction (default: LINK_EXPIRY_SWEEP_CHUNK_SIZE).")
+        parser.add_argument('--limit', type=int, help="Stop after this many links.")
+        parser.add_argument('--dry-run', action='store_true', help="Only count the expired links.")
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        if options['dry_run']:
+            count = Link.objects.filter(is_active=True, expires_at__lte=now).count()
+            self.stdout.write(f"{count} expired links would be deactivated.")
+            return
+
+        swept = sweep_expired_links(options['chunk_size'], options['limit'], now=now)
+        self.stdout.write(self.style.SUCCESS(f"Deactivated {swept} expired links."))
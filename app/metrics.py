@@ -0,0 +1,186 @@
+import bisect
+import threading
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    body = ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+        for name, value in pairs
+    )
+    return '{' + body + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            yield self.name, _format_labels(self.labelnames, labels), value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(labels, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[index] += 1
+            self._values[labels] = (counts, total + value)
+
+    def totals(self):
+        with self._lock:
+            return {labels: (sum(counts), total) for labels, (counts, total) in self._values.items()}
+
+    def samples(self):
+        with self._lock:
+            items = [(labels, list(counts), total) for labels, (counts, total) in self._values.items()]
+        for labels, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield (
+                    self.name + '_bucket',
+                    _format_labels(self.labelnames, labels, [('le', _format_value(bound))]),
+                    cumulative,
+                )
+            yield self.name + '_sum', _format_labels(self.labelnames, labels), total
+            yield self.name + '_count', _format_labels(self.labelnames, labels), cumulative
+
+
+class GaugeCollector:
+    """Gauges read at scrape time from ``collect()``, which yields ``(labels, value)``."""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames, collect):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+
+    def samples(self):
+        for labels, value in self.collect():
+            yield self.name, _format_labels(self.labelnames, labels), value
+
+
+class MetricsRegistry:
+    """
+    Process-local metrics rendered in the Prometheus text format.
+
+    Each worker process keeps its own values; scrape every worker (or rely on
+    the scraper's per-instance labels) to get the full picture.
+    """
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name, documentation, labelnames, collect):
+        return self.register(GaugeCollector(name, documentation, labelnames, collect))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{labels} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+REQUEST_LATENCY = registry.histogram(
+    'urlshortener_request_duration_seconds',
+    'Request latency by view.',
+    ['view', 'method', 'status'],
+)
+REQUEST_DB_QUERIES = registry.histogram(
+    'urlshortener_request_db_queries',
+    'Database queries executed per request.',
+    ['view', 'method'],
+    buckets=QUERY_COUNT_BUCKETS,
+)
+REQUEST_DB_DURATION = registry.histogram(
+    'urlshortener_request_db_duration_seconds',
+    'Time spent in database queries per request.',
+    ['view', 'method'],
+)
+CLICKS_DROPPED = registry.counter(
+    'urlshortener_clicks_dropped_total',
+    'Redirect clicks that were never written, by reason.',
+    ['reason'],
+)
+RATE_LIMITED = registry.counter(
+    'urlshortener_rate_limited_total',
+    'Requests rejected by a rate limit.',
+    ['scope'],
+)
+
+
+def _collect_cache_stats():
+    from .cache import link_cache
+    from .utils import geoip_cache_stats, user_agent_cache_stats
+
+    for cache_name, stats in (
+        ('link_resolution', link_cache.stats()),
+        ('user_agent', user_agent_cache_stats()),
+        ('geoip', geoip_cache_stats()),
+    ):
+        for stat in ('hits', 'local_hits', 'shared_hits', 'misses', 'evictions', 'size', 'local_size', 'hit_rate'):
+            if stat in stats:
+                yield (cache_name, stat), stats[stat]
+
+
+registry.gauge(
+    'urlshortener_cache',
+    'In-process cache statistics.',
+    ['cache', 'stat'],
+    _collect_cache_stats,
+)
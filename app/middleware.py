@@ -0,0 +1,179 @@
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from rest_framework.permissions import SAFE_METHODS
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from .metrics import REQUEST_DB_DURATION, REQUEST_DB_QUERIES, REQUEST_LATENCY
+from .redirects import aserve_redirect, serve_redirect
+from .routers import primary_pin
+
+
+class QueryTracker:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+# Under ASGI sync views run on executor threads with their own connections, so
+# a per-request execute_wrapper installed by the middleware would never see
+# their queries. Instead every connection gets one permanent wrapper that
+# reports to the tracker of the current request (context vars follow
+# sync_to_async onto the executor thread).
+_current_tracker = ContextVar('query_tracker', default=None)
+
+
+def _track_query(execute, sql, params, many, context):
+    tracker = _current_tracker.get()
+    if tracker is None:
+        return execute(sql, params, many, context)
+    return tracker(execute, sql, params, many, context)
+
+
+def install_query_tracker(connection, **kwargs):
+    if _track_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_track_query)
+
+
+connection_created.connect(install_query_tracker)
+
+
+class MetricsMiddleware:
+    """
+    Records latency, query count and query time per view, and optionally
+    reports them in a ``Server-Timing`` header (settings.METRICS).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.server_timing = settings.METRICS['SERVER_TIMING']
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        # Connections opened before this module was imported missed the signal.
+        for connection in connections.all(initialized_only=True):
+            install_query_tracker(connection)
+        tracker = QueryTracker()
+        token = _current_tracker.set(tracker)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_tracker.reset(token)
+        return self.record(request, response, tracker, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        tracker = QueryTracker()
+        token = _current_tracker.set(tracker)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_tracker.reset(token)
+        return self.record(request, response, tracker, time.perf_counter() - start)
+
+    def record(self, request, response, tracker, elapsed):
+        match = request.resolver_match
+        view = match.view_name if match else getattr(request, 'metrics_view', 'unmatched')
+        REQUEST_LATENCY.observe(elapsed, view, request.method, response.status_code)
+        REQUEST_DB_QUERIES.observe(tracker.count, view, request.method)
+        REQUEST_DB_DURATION.observe(tracker.duration, view, request.method)
+
+        if self.server_timing:
+            response['Server-Timing'] = (
+                f'app;dur={elapsed * 1000:.2f}, '
+                f'db;dur={tracker.duration * 1000:.2f};desc="{tracker.count} queries"'
+            )
+        return response
+
+
+class ReplicaPinMiddleware:
+    """
+    Gives every request a fresh replica pin (worker threads are reused, so a pin
+    set by one request must not leak into the next) and pins unsafe requests to
+    the primary from the start, so the object they modify is read there too.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with primary_pin(request.method not in SAFE_METHODS):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with primary_pin(request.method not in SAFE_METHODS):
+            return await self.get_response(request)
+
+
+class RedirectFastPathMiddleware:
+    """
+    Serves ``GET``/``HEAD /r/<short_code>/`` directly with app.redirects, skipping
+    the middleware below it, URL resolution and DRF; any other request passes
+    through. Responses keep the status codes and JSON bodies of
+    LinkRedirectView. Disabled with REDIRECT_FAST_PATH=False.
+    """
+
+    sync_capable = True
+    async_capable = True
+    prefix = '/r/'
+    view_name = 'link-redirect'
+
+    def __init__(self, get_response):
+        if not settings.REDIRECT_FAST_PATH:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def get_short_code(self, request):
+        path = request.path_info
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        if not path.startswith(self.prefix) or not path.endswith('/'):
+            return None
+        short_code = path[len(self.prefix):-1]
+        if not short_code or '/' in short_code:
+            return None
+        return short_code
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        short_code = self.get_short_code(request)
+        if short_code is None:
+            return self.get_response(request)
+        request.metrics_view = self.view_name
+        return serve_redirect(request, short_code)
+
+    async def __acall__(self, request):
+        short_code = self.get_short_code(request)
+        if short_code is None:
+            return await self.get_response(request)
+        request.metrics_view = self.view_name
+        return await aserve_redirect(request, short_code)
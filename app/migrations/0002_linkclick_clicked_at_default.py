@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:01
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='linkclick',
+            name='clicked_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0002_linkclick_clicked_at_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LinkClickRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('country', models.CharField(blank=True, default='', max_length=100)),
+                ('device_type', models.CharField(blank=True, default='', max_length=50)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('link', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='app.link')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('link', 'date', 'country', 'device_type'), name='unique_link_click_rollup')],
+            },
+        ),
+    ]
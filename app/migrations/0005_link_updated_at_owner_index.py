@@ -0,0 +1,24 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_shortcodesequence'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='link',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='link',
+            index=models.Index(fields=['created_by', 'created_at', 'id'], name='link_owner_created_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:12
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_link_updated_at_owner_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='link',
+            name='redirect_max_age',
+            field=models.PositiveIntegerField(blank=True, null=True, validators=[django.core.validators.MaxValueValidator(31536000)]),
+        ),
+        migrations.AddField(
+            model_name='link',
+            name='redirect_policy',
+            field=models.CharField(choices=[('permanent', '301, cacheable'), ('permanent-strict', '308, cacheable'), ('temporary', '302, cacheable by shared caches'), ('temporary-strict', '307, cacheable by shared caches'), ('no-store', '302, never cached')], default='no-store', max_length=20),
+        ),
+    ]
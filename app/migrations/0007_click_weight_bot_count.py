@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_link_redirect_policy'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='link',
+            name='bot_click_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='linkclick',
+            name='weight',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_click_weight_bot_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LinkDailyUniques',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('sketch', models.BinaryField()),
+                ('link', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_uniques', to='app.link')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('link', 'date'), name='unique_link_daily_uniques')],
+            },
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_linkdailyuniques'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Referrer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hash', models.CharField(max_length=32, unique=True)),
+                ('url', models.URLField(max_length=2000)),
+                ('host', models.CharField(db_index=True, max_length=255)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserAgent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hash', models.CharField(max_length=32, unique=True)),
+                ('value', models.TextField()),
+            ],
+        ),
+        migrations.RemoveConstraint(
+            model_name='linkclickrollup',
+            name='unique_link_click_rollup',
+        ),
+        migrations.AddField(
+            model_name='linkclick',
+            name='country_code',
+            field=models.CharField(blank=True, default='', max_length=2),
+        ),
+        migrations.AddField(
+            model_name='linkclick',
+            name='device',
+            field=models.PositiveSmallIntegerField(blank=True, choices=[(0, 'Unknown'), (1, 'Desktop'), (2, 'Mobile'), (3, 'Tablet'), (4, 'Bot'), (5, 'Other')], null=True),
+        ),
+        migrations.AddField(
+            model_name='linkclickrollup',
+            name='country_code',
+            field=models.CharField(blank=True, default='', max_length=2),
+        ),
+        migrations.AddField(
+            model_name='linkclickrollup',
+            name='device',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Unknown'), (1, 'Desktop'), (2, 'Mobile'), (3, 'Tablet'), (4, 'Bot'), (5, 'Other')], default=0),
+        ),
+        migrations.AddField(
+            model_name='linkclick',
+            name='referrer_ref',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='app.referrer'),
+        ),
+        migrations.AddField(
+            model_name='linkclick',
+            name='user_agent_ref',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='app.useragent'),
+        ),
+    ]
@@ -0,0 +1,217 @@
+import hashlib
+from collections import Counter
+from functools import lru_cache
+from urllib.parse import urlsplit
+
+import pycountry
+from django.db import migrations, transaction
+
+BATCH_SIZE = 5000
+ROLLUP_LINKS_PER_BATCH = 500
+
+# Frozen copies of app.models.DeviceType and the app.dimensions helpers as of
+# this migration, so later changes there don't change what it writes.
+DEVICE_TYPE_LABELS = {0: 'Unknown', 1: 'Desktop', 2: 'Mobile', 3: 'Tablet', 4: 'Bot', 5: 'Other'}
+DEVICE_TYPES_BY_LABEL = {label: value for value, label in DEVICE_TYPE_LABELS.items()}
+UNKNOWN_DEVICE = 0
+
+REFERRER_MAX_LENGTH = 2000
+
+GEOIP_COUNTRY_NAMES = {
+    'BN': 'Brunei',
+    'BQ': 'Bonaire, Sint Eustatius, and Saba',
+    'CD': 'DR Congo',
+    'CG': 'Congo Republic',
+    'CI': 'Ivory Coast',
+    'FK': 'Falkland Islands',
+    'FM': 'Federated States of Micronesia',
+    'JO': 'Hashemite Kingdom of Jordan',
+    'KN': 'St Kitts and Nevis',
+    'MF': 'Saint Martin',
+    'MO': 'Macao',
+    'NL': 'The Netherlands',
+    'PN': 'Pitcairn Islands',
+    'PS': 'Palestine',
+    'RU': 'Russia',
+    'SX': 'Sint Maarten',
+    'UM': 'U.S. Minor Outlying Islands',
+    'VA': 'Vatican City',
+    'VC': 'St Vincent and Grenadines',
+    'VG': 'British Virgin Islands',
+    'VI': 'U.S. Virgin Islands',
+    'XK': 'Kosovo',
+}
+_GEOIP_COUNTRY_CODES = {name: code for code, name in GEOIP_COUNTRY_NAMES.items()}
+
+
+@lru_cache(maxsize=None)
+def country_name(code):
+    if not code:
+        return None
+    if code in GEOIP_COUNTRY_NAMES:
+        return GEOIP_COUNTRY_NAMES[code]
+    country = pycountry.countries.get(alpha_2=code)
+    if country is None:
+        return code
+    return getattr(country, 'common_name', None) or country.name
+
+
+@lru_cache(maxsize=None)
+def country_code(name):
+    if not name:
+        return ''
+    if name in _GEOIP_COUNTRY_CODES:
+        return _GEOIP_COUNTRY_CODES[name]
+    try:
+        return pycountry.countries.lookup(name).alpha_2
+    except LookupError:
+        return ''
+
+
+def device_type_for(label):
+    return DEVICE_TYPES_BY_LABEL.get(label, UNKNOWN_DEVICE)
+
+
+def dimension_hash(value):
+    return hashlib.blake2b(value.encode(), digest_size=16).hexdigest()
+
+
+def referrer_host(url):
+    try:
+        return (urlsplit(url).hostname or '')[:255]
+    except ValueError:
+        return ''
+
+
+def resolve(model, values, build):
+    by_hash = {dimension_hash(value): value for value in values if value}
+    found = dict(model.objects.filter(hash__in=by_hash).values_list('hash', 'id'))
+    model.objects.bulk_create(
+        [build(digest, value) for digest, value in by_hash.items() if digest not in found],
+        ignore_conflicts=True,
+    )
+    found = dict(model.objects.filter(hash__in=by_hash).values_list('hash', 'id'))
+    return {value: found[digest] for digest, value in by_hash.items()}
+
+
+def convert_clicks(apps, schema_editor):
+    LinkClick = apps.get_model('app', 'LinkClick')
+    UserAgent = apps.get_model('app', 'UserAgent')
+    Referrer = apps.get_model('app', 'Referrer')
+
+    last_id = 0
+    while True:
+        rows = list(
+            LinkClick.objects.filter(id__gt=last_id).order_by('id')
+            .values_list('id', 'user_agent', 'referrer', 'country', 'device_type')[:BATCH_SIZE]
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        # One transaction per batch, so a large table never holds one huge
+        # transaction; batches are idempotent, so an interrupted run can simply
+        # be started again.
+        with transaction.atomic():
+            user_agents = resolve(
+                UserAgent, {row[1] for row in rows},
+                lambda digest, value: UserAgent(hash=digest, value=value),
+            )
+            referrers = resolve(
+                Referrer, {(row[2] or '')[:REFERRER_MAX_LENGTH] for row in rows},
+                lambda digest, value: Referrer(hash=digest, url=value, host=referrer_host(value)),
+            )
+            LinkClick.objects.bulk_update(
+                [
+                    LinkClick(
+                        id=pk,
+                        user_agent_ref_id=user_agents.get(user_agent),
+                        referrer_ref_id=referrers.get((referrer or '')[:REFERRER_MAX_LENGTH]),
+                        country_code=country_code(country),
+                        device=device_type_for(device_type) if device_type else None,
+                    )
+                    for pk, user_agent, referrer, country, device_type in rows
+                ],
+                ['user_agent_ref', 'referrer_ref', 'country_code', 'device'],
+                batch_size=1000,
+            )
+
+
+def restore_clicks(apps, schema_editor):
+    LinkClick = apps.get_model('app', 'LinkClick')
+
+    last_id = 0
+    while True:
+        rows = list(
+            LinkClick.objects.filter(id__gt=last_id).order_by('id')
+            .values_list('id', 'user_agent_ref__value', 'referrer_ref__url', 'country_code', 'device')[:BATCH_SIZE]
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        with transaction.atomic():
+            LinkClick.objects.bulk_update(
+                [
+                    LinkClick(
+                        id=pk, user_agent=user_agent, referrer=referrer,
+                        country=country_name(code), device_type=DEVICE_TYPE_LABELS.get(device),
+                    )
+                    for pk, user_agent, referrer, code, device in rows
+                ],
+                ['user_agent', 'referrer', 'country', 'device_type'],
+                batch_size=1000,
+            )
+
+
+def convert_rollups(apps, schema_editor):
+    def key(row):
+        return (country_code(row.country), device_type_for(row.device_type))
+
+    def build(model, link_id, date, code, device, count):
+        return model(link_id=link_id, date=date, country_code=code, device=device, count=count)
+
+    rewrite_rollups(apps, key, build)
+
+
+def restore_rollups(apps, schema_editor):
+    def key(row):
+        return (country_name(row.country_code) or '', DEVICE_TYPE_LABELS.get(row.device, ''))
+
+    def build(model, link_id, date, country, device_type, count):
+        return model(link_id=link_id, date=date, country=country, device_type=device_type, count=count)
+
+    rewrite_rollups(apps, key, build)
+
+
+def rewrite_rollups(apps, key, build):
+    LinkClickRollup = apps.get_model('app', 'LinkClickRollup')
+    link_ids = list(
+        LinkClickRollup.objects.order_by('link_id').values_list('link_id', flat=True).distinct()
+    )
+    for start in range(0, len(link_ids), ROLLUP_LINKS_PER_BATCH):
+        chunk = link_ids[start:start + ROLLUP_LINKS_PER_BATCH]
+        # Several old keys can map to one new key (NULL and '' device types,
+        # or two names of one country), so merge per link instead of updating
+        # rows in place.
+        merged = Counter()
+        for row in LinkClickRollup.objects.filter(link_id__in=chunk):
+            merged[(row.link_id, row.date) + key(row)] += row.count
+        with transaction.atomic():
+            LinkClickRollup.objects.filter(link_id__in=chunk).delete()
+            LinkClickRollup.objects.bulk_create(
+                [build(LinkClickRollup, *fields, count) for fields, count in merged.items()],
+                batch_size=1000,
+            )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('app', '0009_click_dimensions'),
+    ]
+
+    operations = [
+        migrations.RunPython(convert_clicks, restore_clicks),
+        migrations.RunPython(convert_rollups, restore_rollups),
+    ]
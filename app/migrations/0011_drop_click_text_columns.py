@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_convert_click_dimensions'),
+    ]
+
+    operations = [
+        migrations.RemoveField(model_name='linkclick', name='user_agent'),
+        migrations.RemoveField(model_name='linkclick', name='referrer'),
+        migrations.RemoveField(model_name='linkclick', name='country'),
+        migrations.RemoveField(model_name='linkclick', name='device_type'),
+        migrations.RenameField(model_name='linkclick', old_name='user_agent_ref', new_name='user_agent'),
+        migrations.RenameField(model_name='linkclick', old_name='referrer_ref', new_name='referrer'),
+        migrations.RenameField(model_name='linkclick', old_name='device', new_name='device_type'),
+        migrations.RemoveField(model_name='linkclickrollup', name='country'),
+        migrations.RemoveField(model_name='linkclickrollup', name='device_type'),
+        migrations.RenameField(model_name='linkclickrollup', old_name='device', new_name='device_type'),
+        migrations.AddConstraint(
+            model_name='linkclickrollup',
+            constraint=models.UniqueConstraint(
+                fields=('link', 'date', 'country_code', 'device_type'), name='unique_link_click_rollup'
+            ),
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:36
+
+import hashlib
+from urllib.parse import urlsplit, urlunsplit
+
+from django.conf import settings
+from django.db import migrations, models, transaction
+
+BATCH_SIZE = 5000
+
+# Frozen copy of app.utils.normalize_url/url_hash as of this migration, so
+# later changes there don't change what it writes.
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url):
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+        host = parts.hostname or ''
+        port = parts.port
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+    userinfo, _, _ = parts.netloc.rpartition('@')
+    netloc = f'[{host}]' if ':' in host else host
+    if port is not None and port != DEFAULT_PORTS.get(scheme):
+        netloc = f'{netloc}:{port}'
+    if userinfo:
+        netloc = f'{userinfo}@{netloc}'
+    return urlunsplit((scheme, netloc, parts.path or '/', parts.query, ''))
+
+
+def url_hash(url):
+    return hashlib.sha256(normalize_url(url).encode()).hexdigest()
+
+
+def backfill_url_hashes(apps, schema_editor):
+    Link = apps.get_model('app', 'Link')
+    connection = schema_editor.connection
+    # Plain executemany: bulk_update's CASE expressions get slow on big tables.
+    sql = 'UPDATE {table} SET {column} = %s WHERE {pk} = %s'.format(
+        table=connection.ops.quote_name(Link._meta.db_table),
+        column=connection.ops.quote_name('url_hash'),
+        pk=connection.ops.quote_name('id'),
+    )
+    last_id = 0
+    while True:
+        rows = list(
+            Link.objects.filter(id__gt=last_id).order_by('id').values_list('id', 'long_url')[:BATCH_SIZE]
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        # One transaction per batch, as in 0010; re-running is harmless.
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(sql, [(url_hash(long_url), pk) for pk, long_url in rows])
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('app', '0011_drop_click_text_columns'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='link',
+            name='url_hash',
+            field=models.CharField(default='', editable=False, max_length=64),
+        ),
+        migrations.RunPython(backfill_url_hashes, migrations.RunPython.noop),
+        # Built after the backfill, so the index isn't updated row by row.
+        migrations.AddIndex(
+            model_name='link',
+            index=models.Index(fields=['created_by', 'url_hash'], name='link_owner_url_hash_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0012_link_url_hash'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='link',
+            index=models.Index(fields=['created_by', 'is_active', 'created_at', 'id'], name='link_owner_active_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='link',
+            index=models.Index(fields=['is_active', 'expires_at'], name='link_active_expires_idx'),
+        ),
+        # Dropped last: the replacement also starts with created_by, which
+        # MySQL needs an index on for the foreign key.
+        migrations.RemoveIndex(
+            model_name='link',
+            name='link_owner_created_idx',
+        ),
+    ]
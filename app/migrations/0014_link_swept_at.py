@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0013_link_expiry_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='link',
+            name='swept_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
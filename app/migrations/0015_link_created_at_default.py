@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:56
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0014_link_swept_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='link',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
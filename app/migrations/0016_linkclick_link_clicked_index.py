@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0015_link_created_at_default'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='linkclick',
+            index=models.Index(fields=['link', 'clicked_at', 'id'], name='click_link_clicked_idx'),
+        ),
+    ]
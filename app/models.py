@@ -1,21 +1,54 @@
-from django.db import models
+from django.conf import settings
+from django.core.validators import MaxValueValidator
+from django.db import IntegrityError, models, transaction
 from django.utils import timezone
 from django.contrib.auth.models import User
-import shortuuid
 from datetime import timedelta
+from .shortcodes import get_short_code_generator
+from .utils import url_hash
+
+class RedirectPolicy(models.TextChoices):
+    PERMANENT = 'permanent', '301, cacheable'
+    PERMANENT_STRICT = 'permanent-strict', '308, cacheable'
+    TEMPORARY = 'temporary', '302, cacheable by shared caches'
+    TEMPORARY_STRICT = 'temporary-strict', '307, cacheable by shared caches'
+    NO_STORE = 'no-store', '302, never cached'
 
 class Link(models.Model):
     short_code = models.CharField(max_length=20, unique=True, db_index=True)
     long_url = models.URLField(max_length=2000)
+    # sha256 of the normalized long_url; long_url itself is too long to index.
+    url_hash = models.CharField(max_length=64, default='', editable=False)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add, which would overwrite creation dates set on purpose
+    # (import_links keeps the exported ones).
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     expires_at = models.DateTimeField(null=True, blank=True)
     is_active = models.BooleanField(default=True)
+    # Set when the expiry sweeper (app/sweeper.py) deactivated the link, so a
+    # new expiry date can bring it back; None once the owner sets is_active.
+    swept_at = models.DateTimeField(null=True, blank=True, editable=False)
     click_count = models.IntegerField(default=0)
+    bot_click_count = models.IntegerField(default=0)
     title = models.CharField(max_length=255, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    redirect_policy = models.CharField(
+        max_length=20, choices=RedirectPolicy.choices, default=RedirectPolicy.NO_STORE
+    )
+    redirect_max_age = models.PositiveIntegerField(
+        null=True, blank=True, validators=[MaxValueValidator(365 * 24 * 3600)]
+    )
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination of an owner's active links on (created_at, id).
+            models.Index(fields=['created_by', 'is_active', 'created_at', 'id'], name='link_owner_active_created_idx'),
+            # Expiry sweeps (app/sweeper.py) only visit active, expired rows.
+            models.Index(fields=['is_active', 'expires_at'], name='link_active_expires_idx'),
+            # Destination lookups and deduplication per owner.
+            models.Index(fields=['created_by', 'url_hash'], name='link_owner_url_hash_idx'),
+        ]
     
     def __str__(self):
         return f"{self.short_code} -> {self.long_url}"
@@ -26,21 +59,96 @@ class Link(models.Model):
         return False
 
     def save(self, *args, **kwargs):
-        if not self.short_code:
-            self.short_code = shortuuid.ShortUUID().random(length=8)
-        
+        self.url_hash = url_hash(self.long_url)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'long_url' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'url_hash'}
+
         if not self.expires_at and not self.pk:
             self.expires_at = timezone.now() + timedelta(days=30)
-        super().save(*args, **kwargs)
+
+        if self.short_code:
+            return super().save(*args, **kwargs)
+
+        generator = get_short_code_generator()
+        max_retries = settings.SHORT_CODE_GENERATOR['MAX_RETRIES']
+        for _ in range(max_retries):
+            self.short_code = generator.generate()
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                if not Link.objects.filter(short_code=self.short_code).exists():
+                    raise
+        self.short_code = ''
+        raise IntegrityError(
+            f"Could not allocate a unique short code after {max_retries} attempts"
+        )
+
+class ShortCodeSequence(models.Model):
+    name = models.CharField(max_length=50, primary_key=True)
+    next_value = models.BigIntegerField()
+
+class DeviceType(models.IntegerChoices):
+    UNKNOWN = 0, 'Unknown'
+    DESKTOP = 1, 'Desktop'
+    MOBILE = 2, 'Mobile'
+    TABLET = 3, 'Tablet'
+    BOT = 4, 'Bot'
+    OTHER = 5, 'Other'
+
+class UserAgent(models.Model):
+    # Distinct User-Agent strings, referenced by LinkClick. hash is a hex
+    # BLAKE2b digest of value (app/dimensions.py), so lookups use a short index.
+    hash = models.CharField(max_length=32, unique=True)
+    value = models.TextField()
+
+class Referrer(models.Model):
+    hash = models.CharField(max_length=32, unique=True)
+    url = models.URLField(max_length=2000)
+    host = models.CharField(max_length=255, db_index=True)
 
 class LinkClick(models.Model):
     link = models.ForeignKey(Link, on_delete=models.CASCADE, related_name='clicks')
-    clicked_at = models.DateTimeField(auto_now_add=True)
+    clicked_at = models.DateTimeField(default=timezone.now)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
-    user_agent = models.TextField(null=True, blank=True)
-    referrer = models.URLField(null=True, blank=True, max_length=2000)
-    country = models.CharField(max_length=100, null=True, blank=True)
-    device_type = models.CharField(max_length=50, null=True, blank=True)
+    user_agent = models.ForeignKey(UserAgent, null=True, blank=True, on_delete=models.PROTECT, related_name='+')
+    referrer = models.ForeignKey(Referrer, null=True, blank=True, on_delete=models.PROTECT, related_name='+')
+    # ISO 3166-1 alpha-2, '' when unknown; app.dimensions.country_name() for display.
+    country_code = models.CharField(max_length=2, blank=True, default='')
+    device_type = models.PositiveSmallIntegerField(choices=DeviceType.choices, null=True, blank=True)
+    # Number of clicks this row stands for; above 1 when the link was sampled.
+    weight = models.PositiveIntegerField(default=1)
     
     class Meta:
-        ordering = ['-clicked_at']
\ No newline at end of file
+        ordering = ['-clicked_at']
+        indexes = [
+            # Keyset pagination and exports of a link's clicks on (clicked_at, id).
+            models.Index(fields=['link', 'clicked_at', 'id'], name='click_link_clicked_idx'),
+        ]
+
+class LinkClickRollup(models.Model):
+    link = models.ForeignKey(Link, on_delete=models.CASCADE, related_name='rollups')
+    date = models.DateField()
+    country_code = models.CharField(max_length=2, blank=True, default='')
+    device_type = models.PositiveSmallIntegerField(choices=DeviceType.choices, default=DeviceType.UNKNOWN)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['link', 'date', 'country_code', 'device_type'],
+                name='unique_link_click_rollup',
+            ),
+        ]
+
+class LinkDailyUniques(models.Model):
+    # HyperLogLog sketch of the day's visitors (app/hll.py).
+    link = models.ForeignKey(Link, on_delete=models.CASCADE, related_name='daily_uniques')
+    date = models.DateField()
+    sketch = models.BinaryField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['link', 'date'], name='unique_link_daily_uniques'),
+        ]
@@ -1,7 +1,7 @@
 from rest_framework import permissions
 from django.conf import settings
 from rest_framework.authentication import BaseAuthentication
-from rest_framework_api_key.permissions import HasAPIKey
+from .authentication import CachedHasAPIKey
 
 class IsOwnerOrReadOnly(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
@@ -17,6 +17,6 @@ class HasAPIKeyOrIsAuthenticated(permissions.BasePermission):
     def has_permission(self, request, view):
         if permissions.IsAuthenticated().has_permission(request, view):
             return True
-        if HasAPIKey().has_permission(request, view):
+        if CachedHasAPIKey().has_permission(request, view):
             return True
         return False
\ No newline at end of file
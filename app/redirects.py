@@ -0,0 +1,146 @@
+from datetime import timedelta
+
+from django.conf import settings
+from asgiref.sync import sync_to_async
+from django.http import HttpResponsePermanentRedirect, HttpResponseRedirect, JsonResponse
+from django.http.response import HttpResponseRedirectBase
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date
+from django.utils.module_loading import import_string
+
+from rest_framework import status
+
+from .cache import link_cache
+from .ingest import ClickRecord, click_buffer
+from .models import RedirectPolicy
+from .throttling import acheck_redirect_limits, check_redirect_limits, throttled_response
+from .utils import get_client_ip
+
+LINK_NOT_FOUND_MESSAGE = "No Link matches the given query."
+
+
+class HttpResponseTemporaryRedirect(HttpResponseRedirectBase):
+    status_code = 307
+
+
+class HttpResponsePermanentRedirectStrict(HttpResponseRedirectBase):
+    status_code = 308
+
+
+REDIRECT_RESPONSES = {
+    RedirectPolicy.PERMANENT: HttpResponsePermanentRedirect,
+    RedirectPolicy.PERMANENT_STRICT: HttpResponsePermanentRedirectStrict,
+    RedirectPolicy.TEMPORARY: HttpResponseRedirect,
+    RedirectPolicy.TEMPORARY_STRICT: HttpResponseTemporaryRedirect,
+    RedirectPolicy.NO_STORE: HttpResponseRedirect,
+}
+
+PERMANENT_POLICIES = {RedirectPolicy.PERMANENT, RedirectPolicy.PERMANENT_STRICT}
+
+
+def get_cache_lifetime(link, now):
+    conf = settings.REDIRECT_CACHE
+    if link.redirect_max_age is not None:
+        lifetime = link.redirect_max_age
+    elif link.redirect_policy in PERMANENT_POLICIES:
+        lifetime = conf['PERMANENT_MAX_AGE']
+    else:
+        lifetime = conf['TEMPORARY_S_MAXAGE']
+    # Never let a cache keep serving the redirect after the link expires.
+    if link.expires_at:
+        lifetime = min(lifetime, int((link.expires_at - now).total_seconds()))
+    return max(lifetime, 0)
+
+
+def build_redirect_response(link):
+    policy = link.redirect_policy
+    response = REDIRECT_RESPONSES.get(policy, HttpResponseRedirect)(link.long_url)
+    if policy == RedirectPolicy.NO_STORE or policy not in REDIRECT_RESPONSES:
+        patch_cache_control(response, no_store=True)
+        return response
+
+    now = timezone.now()
+    lifetime = get_cache_lifetime(link, now)
+    if policy in PERMANENT_POLICIES:
+        # Browsers and CDNs both keep it.
+        patch_cache_control(response, public=True, max_age=lifetime)
+        response['Expires'] = http_date((now + timedelta(seconds=lifetime)).timestamp())
+    else:
+        # Only shared caches keep it, so browsers keep coming back to the edge.
+        patch_cache_control(response, public=True, max_age=0, s_maxage=lifetime)
+        response['Expires'] = http_date(now.timestamp())
+    return response
+
+
+def get_unavailable_reason(link):
+    # Expiry first: the sweeper deactivates expired links too.
+    if link.is_expired():
+        return "This short URL has expired"
+    if not link.is_active:
+        return "This short URL has been deactivated"
+    return None
+
+
+def build_click_record(request, link):
+    return ClickRecord(
+        link_id=link.id,
+        clicked_at=timezone.now(),
+        ip_address=get_client_ip(request),
+        user_agent=request.META.get('HTTP_USER_AGENT', ''),
+        referrer=request.META.get('HTTP_REFERER', ''),
+    )
+
+
+def not_found_response():
+    return JsonResponse({"detail": LINK_NOT_FOUND_MESSAGE}, status=status.HTTP_404_NOT_FOUND)
+
+
+def gone_response(reason):
+    return JsonResponse({"error": reason}, status=status.HTTP_410_GONE)
+
+
+def serve_redirect(request, short_code):
+    """
+    Answer a redirect request without DRF: the same 429/404/410 JSON bodies as
+    LinkRedirectView, the click queued for the buffer, then the redirect.
+    """
+    wait = check_redirect_limits(request, short_code)
+    if wait is not None:
+        return throttled_response(wait)
+
+    link = link_cache.resolve(short_code)
+    if link is None:
+        return not_found_response()
+    reason = get_unavailable_reason(link)
+    if reason:
+        return gone_response(reason)
+
+    click_buffer.enqueue(build_click_record(request, link))
+    return build_redirect_response(link)
+
+
+async def aserve_redirect(request, short_code):
+    wait = await acheck_redirect_limits(request, short_code)
+    if wait is not None:
+        return throttled_response(wait)
+
+    link = await link_cache.aresolve(short_code)
+    if link is None:
+        return not_found_response()
+    reason = get_unavailable_reason(link)
+    if reason:
+        return gone_response(reason)
+
+    record = build_click_record(request, link)
+    if not click_buffer.offer(record):
+        await sync_to_async(click_buffer.enqueue)(record)
+    return build_redirect_response(link)
+
+
+def purge_link_caches(*short_codes):
+    """Drop cached resolutions and ask the edge to forget the redirects."""
+    link_cache.invalidate(*short_codes)
+    hook = settings.REDIRECT_CACHE['PURGE_HOOK']
+    if hook and short_codes:
+        import_string(hook)(list(short_codes))
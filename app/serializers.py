@@ -1,4 +1,7 @@
+from operator import attrgetter
+
 from rest_framework import serializers
+from .dimensions import country_name
 from .models import Link, LinkClick
 from django.utils import timezone
 from rest_framework import serializers
@@ -7,15 +10,36 @@ from django.contrib.auth.models import User
 class LinkSerializer(serializers.ModelSerializer):
     short_url = serializers.SerializerMethodField()
     is_expired = serializers.SerializerMethodField()
+
+    # Model columns each output field reads, for turning ?fields= into .only().
+    field_sources = {
+        'short_url': ['short_code'],
+        'is_expired': ['expires_at'],
+    }
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def model_fields_for(cls, fields):
+        columns = {'id', 'created_at'}
+        for name in fields:
+            columns.update(cls.field_sources.get(name, [name]))
+        return sorted(columns)
     
     class Meta:
         model = Link
         fields = [
             'id', 'short_code', 'long_url', 'short_url', 
             'created_at', 'expires_at', 'is_active', 
-            'click_count', 'title', 'is_expired', 'created_by',
+            'click_count', 'bot_click_count', 'title', 'is_expired', 'created_by',
+            'redirect_policy', 'redirect_max_age',
         ]
-        read_only_fields = ['short_code', 'created_at', 'click_count', 'created_by']
+        read_only_fields = ['short_code', 'created_at', 'click_count', 'bot_click_count', 'created_by']
     
     def get_short_url(self, obj):
         request = self.context.get('request')
@@ -42,15 +66,90 @@ class LinkSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 "This data cannot be updated because Created_by is null."
             )
+        if instance.swept_at is not None:
+            # Deactivated by the expiry sweeper: a new expiry date brings it
+            # back unless is_active is set too, which hands it to the owner.
+            if 'expires_at' in validated_data and 'is_active' not in validated_data:
+                validated_data['is_active'] = True
+            if 'is_active' in validated_data:
+                validated_data['swept_at'] = None
         return super().update(instance, validated_data)
 
+class LinkReadSerializer(serializers.BaseSerializer):
+    """
+    Read-only LinkSerializer for listings, producing the same output.
+
+    Rows become plain dicts through one getter per requested field; the /r/
+    base URL and the clock for is_expired are taken once per serializer (so
+    once per response with many=True) instead of once per link.
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        names = LinkSerializer.Meta.fields if fields is None else fields
+        self.getters = [(name, self.get_getter(name)) for name in names]
+        self.datetime_field = serializers.DateTimeField()
+        self.short_url_base = None
+        self.now = None
+
+    def get_getter(self, name):
+        if name in ('created_at', 'expires_at'):
+            value = attrgetter(name)
+            return lambda link: self.datetime_field.to_representation(value(link))
+        if name == 'short_url':
+            return lambda link: f'{self.short_url_base}{link.short_code}/'
+        if name == 'is_expired':
+            return lambda link: link.expires_at is not None and self.now > link.expires_at
+        if name == 'created_by':
+            return attrgetter('created_by_id')
+        return attrgetter(name)
+
+    def to_representation(self, instance):
+        if self.now is None:
+            request = self.context.get('request')
+            self.short_url_base = request.build_absolute_uri('/r/') if request else '/r/'
+            self.now = timezone.now()
+        return {name: getter(instance) for name, getter in self.getters}
+
+class BatchOperationSerializer(serializers.Serializer):
+    op = serializers.ChoiceField(choices=['create', 'deactivate', 'extend', 'delete'])
+    short_code = serializers.CharField(max_length=20, required=False)
+    expires_at = serializers.DateTimeField(required=False)
+
+    def validate(self, data):
+        if data['op'] == 'create':
+            return data
+        if 'short_code' not in data:
+            raise serializers.ValidationError({'short_code': ["This field is required."]})
+        if data['op'] == 'extend':
+            if 'expires_at' not in data:
+                raise serializers.ValidationError({'expires_at': ["This field is required."]})
+            if data['expires_at'] < timezone.now():
+                raise serializers.ValidationError("Expiration date must be in the future")
+        return data
+
 class LinkClickSerializer(serializers.ModelSerializer):
+    # Stored as dimension ids and codes; rendered as the strings the API has
+    # always returned.
+    user_agent = serializers.SerializerMethodField()
+    referrer = serializers.SerializerMethodField()
+    country = serializers.SerializerMethodField()
+    device_type = serializers.CharField(source='get_device_type_display', read_only=True)
+
     class Meta:
         model = LinkClick
-        fields = ['clicked_at', 'ip_address', 'user_agent', 'referrer', 'country', 'device_type']
+        fields = ['clicked_at', 'ip_address', 'user_agent', 'referrer', 'country', 'device_type', 'weight']
+
+    def get_user_agent(self, obj):
+        return obj.user_agent.value if obj.user_agent_id else ''
+
+    def get_referrer(self, obj):
+        return obj.referrer.url if obj.referrer_id else ''
+
+    def get_country(self, obj):
+        return country_name(obj.country_code)
 
 class LinkAnalyticsSerializer(serializers.ModelSerializer):
-    clicks = LinkClickSerializer(many=True, read_only=True)
     clicks_by_day = serializers.SerializerMethodField()
     clicks_by_country = serializers.SerializerMethodField()
     clicks_by_device = serializers.SerializerMethodField()
@@ -58,8 +157,8 @@ class LinkAnalyticsSerializer(serializers.ModelSerializer):
     class Meta:
         model = Link
         fields = [
-            'short_code', 'long_url', 'click_count', 'created_at',
-            'clicks', 'clicks_by_day', 'clicks_by_country', 'clicks_by_device'
+            'short_code', 'long_url', 'click_count', 'bot_click_count', 'created_at',
+            'clicks_by_day', 'clicks_by_country', 'clicks_by_device'
         ]
     
     def get_clicks_by_day(self, obj):
@@ -0,0 +1,129 @@
+import os
+import string
+import threading
+
+import shortuuid
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils.module_loading import import_string
+
+BASE62_ALPHABET = string.digits + string.ascii_letters
+
+
+def base62_encode(number):
+    if number == 0:
+        return BASE62_ALPHABET[0]
+    digits = []
+    while number:
+        number, remainder = divmod(number, 62)
+        digits.append(BASE62_ALPHABET[remainder])
+    return ''.join(reversed(digits))
+
+
+class ShortCodeGenerator:
+    def generate(self):
+        raise NotImplementedError
+
+    def generate_many(self, count):
+        return [self.generate() for _ in range(count)]
+
+
+class RandomShortCodeGenerator(ShortCodeGenerator):
+    def __init__(self, length=8, **options):
+        self.length = length
+        self.uuid = shortuuid.ShortUUID()
+
+    def generate(self):
+        return self.uuid.random(length=self.length)
+
+
+class SequenceShortCodeGenerator(ShortCodeGenerator):
+    """
+    Base62-encoded counter handed out from blocks reserved in ShortCodeSequence.
+
+    Each process reserves ``block_size`` values in one short transaction and then
+    allocates from memory. Values start at 62**3 and stay below 62**7 for a very
+    long time, so codes are 4-7 characters and never collide with the 8-character
+    random codes issued before.
+    """
+
+    start = 62 ** 3
+
+    def __init__(self, block_size=1000, sequence='link', **options):
+        self.block_size = block_size
+        self.sequence = sequence
+        self._lock = threading.Lock()
+        self._pid = None
+        self._next = self._end = 0
+
+    def generate(self):
+        return self.generate_many(1)[0]
+
+    def generate_many(self, count):
+        codes = []
+        with self._lock:
+            if self._pid != os.getpid():
+                # Never share a block with a forked parent or sibling.
+                self._pid = os.getpid()
+                self._next = self._end = 0
+            while len(codes) < count:
+                if self._next >= self._end:
+                    self._next, self._end = self.reserve(
+                        max(self.block_size, count - len(codes))
+                    )
+                take = min(count - len(codes), self._end - self._next)
+                codes.extend(base62_encode(n) for n in range(self._next, self._next + take))
+                self._next += take
+        return codes
+
+    def reserve(self, size):
+        connection = connections[DEFAULT_DB_ALIAS]
+        if connection.in_atomic_block and connection.vendor != 'sqlite':
+            # A rollback of the caller's transaction would hand the same block
+            # to another process, so reserve on a connection of its own.
+            # (SQLite has a single writer; a second connection would just block.)
+            result = []
+            worker = threading.Thread(target=lambda: result.append(self._reserve_and_close(size)))
+            worker.start()
+            worker.join()
+            if not result:
+                raise RuntimeError("Short code block reservation failed")
+            return result[0]
+        return self._reserve(size)
+
+    def _reserve_and_close(self, size):
+        try:
+            return self._reserve(size)
+        finally:
+            connections.close_all()
+
+    def _reserve(self, size):
+        from .models import ShortCodeSequence
+
+        with transaction.atomic():
+            sequence, _ = ShortCodeSequence.objects.select_for_update().get_or_create(
+                name=self.sequence, defaults={'next_value': self.start}
+            )
+            first = sequence.next_value
+            sequence.next_value = first + size
+            sequence.save(update_fields=['next_value'])
+        return first, first + size
+
+
+STRATEGIES = {
+    'random': RandomShortCodeGenerator,
+    'sequence': SequenceShortCodeGenerator,
+}
+
+_generators = {}
+_generators_lock = threading.Lock()
+
+
+def get_short_code_generator():
+    conf = settings.SHORT_CODE_GENERATOR
+    strategy = conf['STRATEGY']
+    with _generators_lock:
+        if strategy not in _generators:
+            cls = STRATEGIES.get(strategy) or import_string(strategy)
+            _generators[strategy] = cls(**conf.get('OPTIONS', {}))
+        return _generators[strategy]
@@ -0,0 +1,20 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_api_key.models import APIKey
+from rest_framework_simplejwt.settings import api_settings
+
+from .authentication import invalidate_api_key, invalidate_user
+
+# QuerySet.update() and raw SQL send no signals: code that changes users or
+# API keys that way must call invalidate_user()/invalidate_api_key() itself, or
+# the old entry is served until AUTH_CACHE's TTL runs out.
+
+@receiver([post_save, post_delete], sender=APIKey)
+def drop_cached_api_key(sender, instance, **kwargs):
+    invalidate_api_key(instance.prefix)
+
+
+@receiver([post_save, post_delete], sender=get_user_model())
+def drop_cached_user(sender, instance, **kwargs):
+    invalidate_user(getattr(instance, api_settings.USER_ID_FIELD))
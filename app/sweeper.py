@@ -0,0 +1,119 @@
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .analytics import invalidate_account_summaries
+from .models import Link
+from .redirects import purge_link_caches
+
+logger = logging.getLogger(__name__)
+
+
+def sweep_expired_links(chunk_size=None, limit=None, now=None):
+    """
+    Deactivates active links whose ``expires_at`` has passed, ``chunk_size`` at
+    a time, and returns how many were deactivated. Swept links get ``swept_at``
+    so that extending them reactivates them.
+
+    Each chunk is a short transaction updating rows by primary key, found
+    through link_active_expires_idx, so the sweep never holds many locks at
+    once and can be interrupted at any point.
+    """
+    conf = settings.LINK_EXPIRY_SWEEP
+    chunk_size = chunk_size or conf['CHUNK_SIZE']
+    now = now or timezone.now()
+    swept = 0
+    while limit is None or swept < limit:
+        size = chunk_size if limit is None else min(chunk_size, limit - swept)
+        rows = list(
+            Link.objects.filter(is_active=True, expires_at__lte=now)
+            .order_by('expires_at', 'id')
+            .values_list('id', 'short_code', 'created_by_id')[:size]
+        )
+        if not rows:
+            break
+        with transaction.atomic():
+            swept_at = timezone.now()
+            Link.objects.filter(id__in=[row[0] for row in rows], is_active=True).update(
+                is_active=False, swept_at=swept_at, updated_at=swept_at
+            )
+        purge_link_caches(*(row[1] for row in rows))
+        invalidate_account_summaries({row[2] for row in rows})
+        swept += len(rows)
+    return swept
+
+
+class ExpirySweeper:
+    """
+    Runs sweep_expired_links every ``INTERVAL`` seconds in a daemon thread.
+
+    Every process that calls ``start()`` gets a thread, but a lock in the shared
+    cache lets only one of them sweep per interval; ``start()`` refuses cache
+    aliases that aren't shared between processes. An ``INTERVAL`` of 0 leaves
+    sweeping to the ``sweep_expired_links`` command (e.g. from cron).
+    """
+
+    lock_key = 'links:expiry-sweep:lock'
+
+    def __init__(self):
+        self._pid = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._start_lock = threading.Lock()
+
+    @property
+    def interval(self):
+        return settings.LINK_EXPIRY_SWEEP['INTERVAL']
+
+    @property
+    def cache(self):
+        return caches[settings.LINK_EXPIRY_SWEEP['ALIAS']]
+
+    def start(self):
+        if self.interval <= 0:
+            return
+        if isinstance(self.cache, (LocMemCache, DummyCache)):
+            raise ImproperlyConfigured(
+                "LINK_EXPIRY_SWEEP_INTERVAL needs a cache shared by all processes "
+                "(LINK_EXPIRY_SWEEP_CACHE_ALIAS, e.g. CACHE_URL=redis://...) for "
+                "its lock; run `manage.py sweep_expired_links` from cron otherwise."
+            )
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, name='expiry-sweeper', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def run_once(self):
+        if not self.cache.add(self.lock_key, os.getpid(), self.interval):
+            return 0
+        return sweep_expired_links()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            close_old_connections()
+            try:
+                swept = self.run_once()
+            except Exception:
+                logger.exception("Expiry sweep failed; retrying next interval")
+            else:
+                if swept:
+                    logger.info("Deactivated %d expired links", swept)
+            finally:
+                close_old_connections()
+
+
+expiry_sweeper = ExpirySweeper()
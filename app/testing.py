@@ -0,0 +1,45 @@
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+
+class _AssertMaxQueriesContext:
+    def __init__(self, test_case, limit, aliases):
+        self.test_case = test_case
+        self.limit = limit
+        self.contexts = [CaptureQueriesContext(connections[alias]) for alias in aliases]
+
+    def __enter__(self):
+        for context in self.contexts:
+            context.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        for context in self.contexts:
+            context.__exit__(exc_type, exc_value, traceback)
+        if exc_type is not None:
+            return
+        queries = [
+            f"{context.connection.alias}: {query['sql']}"
+            for context in self.contexts
+            for query in context.captured_queries
+        ]
+        if len(queries) > self.limit:
+            self.test_case.fail(
+                "%d queries executed, budget is %d\nCaptured queries were:\n%s" % (
+                    len(queries), self.limit,
+                    '\n'.join(f'{i}. {sql}' for i, sql in enumerate(queries, start=1)),
+                )
+            )
+
+
+class QueryBudgetMixin:
+    """
+    ``assertMaxQueries(n)`` fails when a block runs more than ``n`` queries
+    across every database the test case uses, so N+1 regressions break the build.
+    """
+
+    def assertMaxQueries(self, limit, using=None):
+        # Only the aliases the test case may use; others (e.g. replicas) refuse
+        # to connect.
+        aliases = [using] if using else [alias for alias in connections if alias in self.databases]
+        return _AssertMaxQueriesContext(self, limit, aliases)
@@ -1 +1,1165 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import os
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock
+
+import geoip2.errors
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, IntegrityError, connection
+from django.db.models import Sum
+from django.db.models.query import QuerySet
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_api_key.models import APIKey
+from rest_framework_simplejwt.tokens import AccessToken
+
+from benchmarks.harness import percentile, summarize
+from benchmarks.seed import ZipfSampler, seed
+
+from . import utils
+from .analytics import increment_daily_uniques, increment_rollups, unique_visitors, visitor_key
+from .authentication import get_auth_cache, user_cache_key
+from .cache import NEGATIVE, LocalLRU, link_cache
+from .ingest import ClickBuffer, ClickRecord, click_buffer
+from .metrics import CLICKS_DROPPED, REQUEST_LATENCY
+from .redirects import LINK_NOT_FOUND_MESSAGE, build_redirect_response, purge_link_caches, serve_redirect
+from .hll import HyperLogLog
+from .models import (
+    DeviceType, Link, LinkClick, LinkClickRollup, LinkDailyUniques, RedirectPolicy, ShortCodeSequence,
+)
+from .renderers import FastJSONRenderer
+from .routers import PrimaryReplicaRouter, primary_pin
+from .serializers import LinkReadSerializer, LinkSerializer
+from .shortcodes import BASE62_ALPHABET, SequenceShortCodeGenerator, base62_encode, get_short_code_generator
+from .sweeper import ExpirySweeper, sweep_expired_links
+from .throttling import FixedWindowLimit
+from .views import LinkClickExportView, link_redirect_async
+from .testing import QueryBudgetMixin
+from .utils import USER_AGENT_KEY_LENGTH, classify_user_agent, get_client_ip, user_agent_cache_stats
+
+
+@override_settings(CLICK_INGEST={**settings.CLICK_INGEST, 'MODE': 'manual'})
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        link_cache.clear()
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.links = [
+            Link.objects.create(long_url=f'https://example.com/{i}', created_by=self.user)
+            for i in range(20)
+        ]
+        LinkClick.objects.bulk_create(
+            LinkClick(link=link, country_code='ID', device_type=DeviceType.MOBILE)
+            for link in self.links for _ in range(3)
+        )
+
+    def test_link_list(self):
+        with self.assertMaxQueries(2):
+            response = self.client.get('/api/links/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_link_analytics(self):
+        # Link, three rollup aggregates and the unique visitor sketches.
+        with self.assertMaxQueries(5):
+            response = self.client.get(f'/api/links/{self.links[0].short_code}/analytics/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_account_summary(self):
+        cache.clear()
+        with self.assertMaxQueries(5):
+            response = self.client.get('/api/analytics/summary/?top=3')
+        self.assertEqual((response.data['total_links'], len(response.data['top_links'])), (20, 3))
+        with self.assertMaxQueries(0):
+            self.client.get('/api/analytics/summary/?top=3')
+
+        # Writing clicks for one of the owner's links drops the cached summary.
+        with self.captureOnCommitCallbacks(execute=True):
+            ClickBuffer().write([ClickRecord(self.links[5].id, timezone.now(), '10.0.0.1', 'Mozilla/5.0', '')])
+        response = self.client.get('/api/analytics/summary/?top=3')
+        self.assertEqual(response.data['total_clicks'], 1)
+        self.assertEqual(response.data['top_links'][0]['short_code'], self.links[5].short_code)
+
+    def test_link_clicks(self):
+        with self.assertMaxQueries(2):
+            response = self.client.get(f'/api/links/{self.links[0].short_code}/clicks/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_redirect(self):
+        with self.assertMaxQueries(1):
+            response = self.client.get(f'/r/{self.links[0].short_code}/')
+        self.assertEqual(response.status_code, 302)
+
+        # Served from the resolution cache the second time.
+        with self.assertMaxQueries(0):
+            self.client.get(f'/r/{self.links[0].short_code}/')
+
+        self.assertEqual(click_buffer.flush(), 2)
+
+
+class UserAgentClassifierTests(SimpleTestCase):
+    def test_bots_and_devices(self):
+        cases = {
+            'Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)': ('Bot', True),
+            'TelegramBot (like TwitterBot)': ('Bot', True),
+            'Slackbot-LinkExpanding 1.0 (+https://api.slack.com/robots)': ('Bot', True),
+            'curl/8.4.0': ('Bot', True),
+            # Phone makers whose names end in "bot" are people, not crawlers.
+            'Mozilla/5.0 (Linux; Android 9; CUBOT X19) AppleWebKit/537.36 (KHTML, like Gecko) '
+            'Chrome/76.0.3809.111 Mobile Safari/537.36': ('Mobile', False),
+            'Mozilla/5.0 (iPhone; CPU iPhone OS 16_0 like Mac OS X) AppleWebKit/605.1.15 '
+            '(KHTML, like Gecko) Version/16.0 Mobile/15E148 Safari/604.1': ('Mobile', False),
+            '': ('Unknown', False),
+        }
+        for user_agent, expected in cases.items():
+            with self.subTest(user_agent=user_agent):
+                self.assertEqual(tuple(classify_user_agent(user_agent)), expected)
+
+    def test_parsed_user_agents_are_memoized(self):
+        # Unique per run, so earlier tests can't have cached it.
+        user_agent = f'Mozilla/5.0 (Windows NT 10.0; Win64; x64) Test/{os.getpid()}.{id(self)}'
+        before = user_agent_cache_stats()
+        classify_user_agent(user_agent)
+        classify_user_agent(user_agent)
+        classify_user_agent('Googlebot/2.1')
+        after = user_agent_cache_stats()
+        self.assertEqual(
+            (after['misses'] - before['misses'], after['hits'] - before['hits'],
+             after['fast_path'] - before['fast_path']),
+            (1, 1, 1),
+        )
+
+        # Only the first USER_AGENT_KEY_LENGTH characters are looked at.
+        padded = user_agent.ljust(USER_AGENT_KEY_LENGTH)
+        classify_user_agent(padded + ' first')
+        classify_user_agent(padded + ' second')
+        final = user_agent_cache_stats()
+        self.assertEqual((final['misses'] - after['misses'], final['hits'] - after['hits']), (1, 1))
+
+
+class GeoIPTests(SimpleTestCase):
+    def setUp(self):
+        # Start from an unopened database and put the module state back afterwards.
+        mock.patch.multiple(
+            'app.utils', _geoip_reader=None, _geoip_path=utils.GEOIP_DATABASE_PATH, _geoip_mtime=None,
+            _geoip_checked_at=None,
+        ).start()
+        mock.patch.dict('app.utils.COUNTRY_NAMES', clear=True).start()
+        self.mtime = mock.patch('app.utils.os.path.getmtime', return_value=1.0).start()
+        self.opened = mock.patch('app.utils._open_geoip_reader').start()
+        self.addCleanup(mock.patch.stopall)
+        utils._lookup_country_code.cache_clear()
+        self.addCleanup(utils._lookup_country_code.cache_clear)
+        self.reader = self.opened.return_value = self.make_reader('ID', 'Indonesia')
+
+    def make_reader(self, code, name):
+        reader = mock.Mock()
+        reader.country.return_value.country.iso_code = code
+        reader.country.return_value.country.name = name
+        return reader
+
+    def test_lookups_are_cached_per_prefix(self):
+        before = utils.geoip_cache_stats()
+        self.assertEqual(utils.get_country_code_from_ip('203.0.113.5'), 'ID')
+        self.assertEqual(utils.get_country_from_ip('203.0.113.77'), 'Indonesia')
+        self.assertEqual(utils.get_country_code_from_ip('2001:db8::1'), 'ID')
+        self.assertIsNone(utils.get_country_code_from_ip('not an ip'))
+        after = utils.geoip_cache_stats()
+
+        self.assertEqual(
+            [call.args for call in self.reader.country.call_args_list], [('203.0.113.0',), ('2001:db8::',)]
+        )
+        self.assertEqual((after['misses'] - before['misses'], after['hits'] - before['hits']), (2, 1))
+        self.assertTrue(after['loaded'])
+        self.assertEqual(self.opened.call_count, 1)
+
+        self.reader.country.side_effect = geoip2.errors.AddressNotFoundError('not found')
+        self.assertIsNone(utils.get_country_code_from_ip('198.51.100.1'))
+
+    def test_replaced_database_is_reloaded(self):
+        self.assertEqual(utils.get_country_code_from_ip('203.0.113.5'), 'ID')
+
+        # The file is only looked at once per GEOIP_RELOAD_CHECK_INTERVAL.
+        self.mtime.return_value = 2.0
+        self.opened.return_value = self.make_reader('US', 'United States')
+        self.assertEqual(utils.get_country_code_from_ip('203.0.113.5'), 'ID')
+
+        utils._geoip_checked_at -= settings.GEOIP_RELOAD_CHECK_INTERVAL + 1
+        self.assertEqual(utils.get_country_code_from_ip('203.0.113.5'), 'US')
+        self.assertEqual(self.opened.call_count, 2)
+
+        # A database that can't be opened leaves the current one in place.
+        self.opened.side_effect = ValueError('corrupt')
+        self.assertFalse(utils.reload_geoip_database())
+        self.assertEqual(utils.get_country_code_from_ip('203.0.113.5'), 'US')
+
+    def test_database_swapped_in_from_another_path_stays(self):
+        self.assertEqual(utils.get_country_code_from_ip('203.0.113.5'), 'ID')
+        mtimes = {utils.GEOIP_DATABASE_PATH: 1.0, '/data/new.mmdb': 5.0}
+        self.mtime.side_effect = mtimes.get
+        self.opened.return_value = self.make_reader('US', 'United States')
+        self.assertTrue(utils.reload_geoip_database('/data/new.mmdb'))
+
+        # Later checks watch the new file, not the configured one.
+        utils._geoip_checked_at -= settings.GEOIP_RELOAD_CHECK_INTERVAL + 1
+        self.assertEqual(utils.get_country_code_from_ip('203.0.113.5'), 'US')
+        self.assertEqual(self.opened.call_args_list[-1].args, ('/data/new.mmdb',))
+        self.assertEqual(self.opened.call_count, 2)
+
+        mtimes['/data/new.mmdb'] = 6.0
+        self.opened.return_value = self.make_reader('DE', 'Germany')
+        utils._geoip_checked_at -= settings.GEOIP_RELOAD_CHECK_INTERVAL + 1
+        self.assertEqual(utils.get_country_code_from_ip('203.0.113.5'), 'DE')
+        self.assertEqual(self.opened.call_args_list[-1].args, ('/data/new.mmdb',))
+
+    def test_missing_database(self):
+        self.mtime.side_effect = OSError
+        self.assertIsNone(utils.get_country_code_from_ip('203.0.113.5'))
+        self.assertFalse(utils.geoip_cache_stats()['loaded'])
+        self.assertFalse(self.opened.called)
+
+
+class LinkListTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.links = [
+            Link.objects.create(long_url=f'https://example.com/{i}', created_by=self.user)
+            for i in range(5)
+        ]
+
+    def test_cursor_pages_cover_every_link_once(self):
+        # Same created_at throughout, so the id tiebreaker decides the order.
+        Link.objects.filter(created_by=self.user).update(created_at=timezone.now())
+        seen = []
+        url = '/api/links/?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen += [link['short_code'] for link in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(seen, [link.short_code for link in reversed(self.links)])
+
+        self.assertEqual(self.client.get('/api/links/?cursor=garbage').status_code, 404)
+
+    def test_sparse_fields(self):
+        response = self.client.get('/api/links/?fields=short_code,long_url,unknown')
+        self.assertEqual(set(response.data['results'][0]), {'short_code', 'long_url'})
+
+    def test_etag_changes_when_a_link_goes_away(self):
+        response = self.client.get('/api/links/')
+        etag = response['ETag']
+        self.assertNotIn('Last-Modified', response)
+        self.assertEqual(self.client.get('/api/links/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Deactivating a link other than the newest leaves the newest
+        # updated_at alone; the count still changes the validator.
+        self.client.patch(f'/api/links/{self.links[0].short_code}/', {'is_active': False}, format='json')
+        response = self.client.get('/api/links/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 4)
+
+        # If-Modified-Since alone never produces a 304.
+        response = self.client.get('/api/links/', HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_changes_when_a_link_expires(self):
+        Link.objects.filter(pk=self.links[0].pk).update(expires_at=timezone.now() + timedelta(hours=1))
+        etag = self.client.get('/api/links/')['ETag']
+
+        # Nothing is written when the link expires; only the clock moves on.
+        later = timezone.now() + timedelta(hours=2)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            response = self.client.get('/api/links/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        expired = {link['short_code']: link['is_expired'] for link in response.data['results']}
+        self.assertTrue(expired[self.links[0].short_code])
+
+
+class LinkClickTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.link = Link.objects.create(long_url='https://example.com/', created_by=self.user)
+        now = timezone.now()
+        # Three clicks share a timestamp, so pages have to split a tie.
+        LinkClick.objects.bulk_create(
+            [LinkClick(link=self.link, clicked_at=now, device_type=DeviceType.MOBILE) for _ in range(3)]
+            + [LinkClick(link=self.link, clicked_at=now - timedelta(minutes=i), weight=i) for i in range(1, 4)]
+        )
+        self.clicks = list(LinkClick.objects.filter(link=self.link).order_by('-clicked_at', '-id'))
+
+    def test_cursor_pages_cover_every_click_once(self):
+        seen = []
+        url = f'/api/links/{self.link.short_code}/clicks/?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen += [click['weight'] for click in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(seen, [click.weight for click in self.clicks])
+
+        response = self.client.get(f'/api/links/{self.link.short_code}/clicks/?cursor=garbage')
+        self.assertEqual(response.status_code, 404)
+
+    def export(self, fmt=None):
+        url = f'/api/links/{self.link.short_code}/clicks/export/'
+        response = self.client.get(url if fmt is None else f'{url}?fmt={fmt}')
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_export_formats(self):
+        response, body = self.export()
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(
+            response['Content-Disposition'], f'attachment; filename="{self.link.short_code}-clicks.csv"'
+        )
+        lines = body.splitlines()
+        self.assertEqual(lines[0], 'clicked_at,ip_address,user_agent,referrer,country,device_type,weight')
+        self.assertEqual(len(lines), 7)
+
+        # Batches of two split the three clicks that share a timestamp.
+        with mock.patch.object(LinkClickExportView, 'chunk_size', 2), CaptureQueriesContext(connection) as queries:
+            response, body = self.export('ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in body.splitlines()]
+        # Oldest first.
+        self.assertEqual([row['weight'] for row in rows], [3, 2, 1, 1, 1, 1])
+        self.assertEqual(sum('app_linkclick' in query['sql'] for query in queries), 4)
+        self.assertEqual(rows[-1]['device_type'], 'Mobile')
+        self.assertEqual(rows[-1]['user_agent'], '')
+
+        response = self.client.get(f'/api/links/{self.link.short_code}/clicks/export/?fmt=xml')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(CLICK_INGEST={**settings.CLICK_INGEST, 'MODE': 'manual'})
+class RedirectFastPathTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        link_cache.clear()
+        self.link = Link.objects.create(long_url='https://example.com/')
+        self.inactive = Link.objects.create(long_url='https://example.com/off', is_active=False)
+
+    def tearDown(self):
+        click_buffer.flush()
+
+    def get(self, path):
+        # Every request below must be answered by the middleware, not the view.
+        with mock.patch('app.views.LinkRedirectView.get', side_effect=AssertionError('served by the view')), \
+                mock.patch('app.middleware.serve_redirect', wraps=serve_redirect) as served:
+            response = self.client.get(path)
+        self.assertTrue(served.called)
+        return response
+
+    def test_statuses_and_bodies(self):
+        before = REQUEST_LATENCY.totals()
+        response = self.get(f'/r/{self.link.short_code}/')
+        self.assertEqual((response.status_code, response['Location']), (302, self.link.long_url))
+
+        response = self.get('/r/missing1/')
+        self.assertEqual((response.status_code, response.json()), (404, {'detail': LINK_NOT_FOUND_MESSAGE}))
+
+        response = self.get(f'/r/{self.inactive.short_code}/')
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(response.json(), {'error': "This short URL has been deactivated"})
+
+        after = REQUEST_LATENCY.totals()
+        for status_code in (302, 404, 410):
+            labels = ('link-redirect', 'GET', status_code)
+            self.assertEqual(after[labels][0] - before.get(labels, (0, 0))[0], 1)
+
+    def test_other_requests_pass_through(self):
+        with mock.patch('app.middleware.serve_redirect') as served:
+            self.client.get(f'/r/{self.link.short_code}')
+            self.client.post(f'/r/{self.link.short_code}/')
+            self.client.get(f'/r/{self.link.short_code}/extra/')
+        self.assertFalse(served.called)
+
+
+def purge_hook(short_codes):
+    pass
+
+
+@override_settings(
+    CLICK_INGEST={**settings.CLICK_INGEST, 'MODE': 'manual'},
+    REDIRECT_CACHE={**settings.REDIRECT_CACHE, 'PERMANENT_MAX_AGE': 3600, 'TEMPORARY_S_MAXAGE': 60},
+)
+class RedirectPolicyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        link_cache.clear()
+
+    def tearDown(self):
+        click_buffer.flush()
+
+    def redirect(self, policy, **fields):
+        link = Link(long_url='https://example.com/', redirect_policy=policy, **fields)
+        response = build_redirect_response(link)
+        self.assertEqual(response['Location'], 'https://example.com/')
+        return response.status_code, response['Cache-Control']
+
+    def test_statuses_and_lifetimes(self):
+        cases = {
+            RedirectPolicy.PERMANENT: (301, 'public, max-age=3600'),
+            RedirectPolicy.PERMANENT_STRICT: (308, 'public, max-age=3600'),
+            RedirectPolicy.TEMPORARY: (302, 'public, max-age=0, s-maxage=60'),
+            RedirectPolicy.TEMPORARY_STRICT: (307, 'public, max-age=0, s-maxage=60'),
+            RedirectPolicy.NO_STORE: (302, 'no-store'),
+        }
+        for policy, expected in cases.items():
+            with self.subTest(policy=policy):
+                self.assertEqual(self.redirect(policy), expected)
+
+    def test_lifetime_overrides(self):
+        self.assertEqual(
+            self.redirect(RedirectPolicy.PERMANENT, redirect_max_age=120), (301, 'public, max-age=120')
+        )
+        # Never cached past the link's expiry.
+        expires_at = timezone.now() + timedelta(seconds=30, milliseconds=500)
+        self.assertEqual(
+            self.redirect(RedirectPolicy.PERMANENT, expires_at=expires_at), (301, 'public, max-age=30')
+        )
+        self.assertEqual(self.redirect(RedirectPolicy.NO_STORE, redirect_max_age=120), (302, 'no-store'))
+
+    def test_served_redirect_uses_the_policy(self):
+        link = Link.objects.create(
+            long_url='https://example.com/', redirect_policy=RedirectPolicy.PERMANENT_STRICT
+        )
+        response = self.client.get(f'/r/{link.short_code}/')
+        self.assertEqual((response.status_code, response['Cache-Control']), (308, 'public, max-age=3600'))
+
+    def test_purge(self):
+        link = Link.objects.create(long_url='https://example.com/')
+        link_cache.resolve(link.short_code)
+        with mock.patch('app.tests.purge_hook') as hook:
+            purge_link_caches(link.short_code)
+            self.assertFalse(hook.called)
+            self.assertIsNone(link_cache.local.get(link.short_code))
+            self.assertIsNone(cache.get(link_cache.make_key(link.short_code)))
+
+            conf = {**settings.REDIRECT_CACHE, 'PURGE_HOOK': 'app.tests.purge_hook'}
+            with override_settings(REDIRECT_CACHE=conf):
+                purge_link_caches(link.short_code, 'other123')
+                purge_link_caches()
+        hook.assert_called_once_with([link.short_code, 'other123'])
+
+
+@override_settings(CLICK_INGEST={**settings.CLICK_INGEST, 'MODE': 'manual'})
+class AsyncRedirectTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        link_cache.clear()
+        self.link = Link.objects.create(long_url='https://example.com/')
+        self.inactive = Link.objects.create(long_url='https://example.com/off', is_active=False)
+        self.factory = AsyncRequestFactory()
+
+    def tearDown(self):
+        click_buffer.flush()
+
+    async def get(self, short_code):
+        return await link_redirect_async(self.factory.get(f'/r/{short_code}/'), short_code=short_code)
+
+    async def test_statuses_and_bodies(self):
+        response = await self.get(self.link.short_code)
+        self.assertEqual((response.status_code, response['Location']), (302, self.link.long_url))
+
+        response = await self.get('missing1')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(json.loads(response.content), {'detail': LINK_NOT_FOUND_MESSAGE})
+
+        response = await self.get(self.inactive.short_code)
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(json.loads(response.content), {'error': "This short URL has been deactivated"})
+
+        # Only the redirect is counted.
+        self.assertEqual(await sync_to_async(click_buffer.flush)(), 1)
+
+    async def test_sync_ingest(self):
+        with override_settings(CLICK_INGEST={**settings.CLICK_INGEST, 'MODE': 'sync'}):
+            response = await self.get(self.link.short_code)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(await LinkClick.objects.filter(link=self.link).acount(), 1)
+
+    async def test_rate_limited(self):
+        conf = {**settings.RATE_LIMITS, 'redirect_link': {'CAPACITY': 1, 'INTERVAL': 60}}
+        with override_settings(RATE_LIMITS=conf, TRUSTED_PROXY_COUNT=0):
+            await self.get(self.link.short_code)
+            response = await self.get(self.link.short_code)
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+
+class MetricsViewTests(SimpleTestCase):
+    def test_closed_without_a_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        with override_settings(METRICS={**settings.METRICS, 'PUBLIC': True}):
+            self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    @override_settings(METRICS={**settings.METRICS, 'AUTH_TOKEN': 'scrape-token', 'PUBLIC': True})
+    def test_token_is_required_when_set(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-token')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'urlshortener_request_duration_seconds', response.content)
+
+
+class AuthCacheTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.api_key, key = APIKey.objects.create_key(name='client')
+        self.client = APIClient()
+        self.client.credentials(HTTP_X_API_KEY=key)
+
+    def test_verified_key_is_cached_until_revoked(self):
+        self.assertEqual(self.client.get('/api/links/').status_code, 200)
+
+        # Key lookup is skipped; only the listing queries remain.
+        with self.assertMaxQueries(2):
+            self.assertEqual(self.client.get('/api/links/').status_code, 200)
+
+        self.api_key.revoked = True
+        self.api_key.save()
+        self.assertEqual(self.client.get('/api/links/').status_code, 401)
+
+    def test_jwt_user_cache_holds_no_password_hash(self):
+        user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        link = Link.objects.create(long_url='https://example.com/', created_by=user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+        self.assertEqual(client.get('/api/links/').status_code, 200)
+
+        entry = get_auth_cache().get(user_cache_key(user.pk))
+        self.assertNotIn(user.password, entry)
+        with self.assertMaxQueries(2):
+            response = client.get('/api/links/')
+        self.assertEqual(response.data['results'][0]['short_code'], link.short_code)
+
+        user.is_active = False
+        user.save()
+        self.assertEqual(client.get('/api/links/').status_code, 401)
+
+
+@override_settings(
+    CLICK_INGEST={**settings.CLICK_INGEST, 'MODE': 'manual'},
+    RATE_LIMITS={**settings.RATE_LIMITS, 'redirect_link': {'CAPACITY': 2, 'INTERVAL': 60}},
+    TRUSTED_PROXY_COUNT=0,
+)
+class RateLimitTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        link_cache.clear()
+        self.link = Link.objects.create(long_url='https://example.com/')
+
+    def tearDown(self):
+        click_buffer.flush()
+
+    def test_redirect_limit_rejects_without_queries(self):
+        for _ in range(2):
+            self.assertEqual(self.client.get(f'/r/{self.link.short_code}/').status_code, 302)
+
+        with self.assertMaxQueries(0):
+            response = self.client.get(f'/r/{self.link.short_code}/')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(click_buffer.flush(), 2)
+
+    def test_ip_limits_are_off_until_proxies_are_configured(self):
+        with override_settings(TRUSTED_PROXY_COUNT=None):
+            for _ in range(3):
+                response = self.client.get(f'/r/{self.link.short_code}/', HTTP_X_FORWARDED_FOR='198.51.100.1')
+                self.assertEqual(response.status_code, 302)
+            self.assertEqual(
+                get_client_ip(APIRequestFactory().get('/', HTTP_X_FORWARDED_FOR='198.51.100.1')), '8.8.8.8'
+            )
+
+    def test_forwarded_for_is_ignored_without_trusted_proxies(self):
+        for ip in ('198.51.100.1', '198.51.100.2', '198.51.100.3'):
+            response = self.client.get(f'/r/{self.link.short_code}/', HTTP_X_FORWARDED_FOR=ip)
+        self.assertEqual(response.status_code, 429)
+
+    @override_settings(TRUSTED_PROXY_COUNT=1)
+    def test_client_ip_is_taken_before_trusted_proxies(self):
+        # The proxy appends the address it saw; a spoofed entry sits in front.
+        for spoofed in ('198.51.100.1', '198.51.100.2', '198.51.100.3'):
+            response = self.client.get(
+                f'/r/{self.link.short_code}/', HTTP_X_FORWARDED_FOR=f'{spoofed}, 203.0.113.9'
+            )
+        self.assertEqual(response.status_code, 429)
+        response = self.client.get(f'/r/{self.link.short_code}/', HTTP_X_FORWARDED_FOR='203.0.113.10')
+        self.assertEqual(response.status_code, 302)
+
+        request = APIRequestFactory().get('/', HTTP_X_FORWARDED_FOR='198.51.100.1, 203.0.113.9')
+        self.assertEqual(get_client_ip(request), '203.0.113.9')
+        with override_settings(TRUSTED_PROXY_COUNT=2):
+            self.assertEqual(get_client_ip(request), '198.51.100.1')
+
+    def test_window_allows_capacity_per_window(self):
+        limit = FixedWindowLimit('test', capacity=3, interval=60)
+        with mock.patch('app.throttling.time.time', return_value=120):
+            self.assertEqual(limit.consume('client', cost=3), (True, 0))
+            allowed, wait = limit.consume('client')
+            self.assertEqual((allowed, wait), (False, 60))
+        # A new window starts with the full capacity again.
+        with mock.patch('app.throttling.time.time', return_value=180):
+            self.assertEqual(limit.consume('client', cost=3), (True, 0))
+
+
+class ClickBufferTests(TestCase):
+    def setUp(self):
+        self.link = Link.objects.create(long_url='https://example.com/')
+
+    def record(self):
+        return ClickRecord(self.link.id, timezone.now(), '203.0.113.7', 'Mozilla/5.0', '')
+
+    @override_settings(CLICK_INGEST={**settings.CLICK_INGEST, 'MODE': 'manual', 'MAX_QUEUE': 2})
+    def test_full_queue_drops_clicks_instead_of_writing_inline(self):
+        buffer = ClickBuffer()
+        dropped = CLICKS_DROPPED.value('queue_full')
+        with mock.patch.object(ClickBuffer, 'write', side_effect=AssertionError('written inline')), \
+                self.assertLogs('app.ingest', 'WARNING'):
+            for _ in range(4):
+                buffer.enqueue(self.record())
+        self.assertEqual(CLICKS_DROPPED.value('queue_full') - dropped, 2)
+        self.assertEqual(buffer.flush(), 2)
+
+    @override_settings(CLICK_INGEST={**settings.CLICK_INGEST, 'MODE': 'sync'})
+    def test_failed_sync_write_does_not_fail_the_redirect(self):
+        link_cache.clear()
+        dropped = CLICKS_DROPPED.value('write_failed')
+        with mock.patch.object(ClickBuffer, 'write', side_effect=DatabaseError('database is down')), \
+                self.assertLogs('app.ingest', 'ERROR'):
+            response = self.client.get(f'/r/{self.link.short_code}/')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(CLICKS_DROPPED.value('write_failed') - dropped, 1)
+
+
+@override_settings(
+    CLICK_INGEST={**settings.CLICK_INGEST, 'BOT_POLICY': 'count'},
+    CLICK_SAMPLING={'THRESHOLD': 10, 'BUDGET': 5, 'WINDOW': 60},
+)
+class IngestPolicyTests(TestCase):
+    def test_bots_counted_and_hot_links_sampled(self):
+        link = Link.objects.create(long_url='https://example.com/')
+        buffer = ClickBuffer()
+
+        def record(user_agent='Mozilla/5.0 (iPhone; CPU iPhone OS 16_0 like Mac OS X)'):
+            return ClickRecord(link.id, timezone.now(), '203.0.113.7', user_agent, '')
+
+        with mock.patch('app.ingest.time.monotonic', return_value=0):
+            buffer.write([record() for _ in range(20)] + [record('Googlebot/2.1')] * 3)
+        # 20 clicks last window, so the next one keeps every 4th row.
+        with mock.patch('app.ingest.time.monotonic', return_value=60):
+            buffer.write([record() for _ in range(40)])
+
+        link.refresh_from_db()
+        self.assertEqual((link.click_count, link.bot_click_count), (60, 3))
+        self.assertEqual(LinkClick.objects.count(), 30)
+        self.assertEqual(LinkClick.objects.aggregate(total=Sum('weight'))['total'], 60)
+        self.assertEqual(LinkClickRollup.objects.aggregate(total=Sum('count'))['total'], 60)
+        # Every human click came from the same visitor.
+        self.assertEqual(unique_visitors(link)[1], 1)
+
+
+class UniqueVisitorTests(TestCase):
+    def test_sketches_merge_into_the_union(self):
+        first = HyperLogLog().update(f'visitor-{i}' for i in range(3000))
+        second = HyperLogLog().update(f'visitor-{i}' for i in range(2000, 5000))
+        merged = HyperLogLog.from_bytes(first.to_bytes()).merge(second)
+        self.assertAlmostEqual(merged.count(), 5000, delta=5000 * 3 * merged.standard_error)
+        # Merging is idempotent, so re-applying a flush never inflates counts.
+        self.assertEqual(merged.merge(second).count(), merged.count())
+        with self.assertRaises(ValueError):
+            first.merge(HyperLogLog(precision=10))
+
+    def test_flushes_merge_and_rebuild_matches(self):
+        link = Link.objects.create(long_url='https://example.com/')
+        today = timezone.now()
+        yesterday = today - timedelta(days=1)
+
+        def clicks(clicked_at, ips):
+            return [LinkClick(link=link, clicked_at=clicked_at, ip_address=ip) for ip in ips]
+
+        batches = [
+            clicks(today, [f'10.0.0.{i}' for i in range(10)]) + clicks(yesterday, ['10.0.1.1']),
+            clicks(today, [f'10.0.0.{i}' for i in range(5, 15)]),
+        ]
+        for batch in batches:
+            increment_daily_uniques(batch)
+        # Merged flushes equal one sketch of the union (15 visitors today).
+        by_day, total = unique_visitors(link)
+        union = HyperLogLog().update(visitor_key(f'10.0.0.{i}', None) for i in range(15))
+        self.assertEqual([day['count'] for day in by_day], [1, union.count()])
+        self.assertEqual(total, union.merge(HyperLogLog().update([visitor_key('10.0.1.1', None)])).count())
+        self.assertAlmostEqual(total, 16, delta=2)
+
+        LinkClick.objects.bulk_create(batches[0] + batches[1])
+        LinkDailyUniques.objects.all().delete()
+        call_command('rebuild_unique_visitors', link.short_code, stdout=io.StringIO())
+        self.assertEqual(unique_visitors(link), (by_day, total))
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.link = Link.objects.create(long_url='https://example.com/')
+        now = timezone.now()
+        self.clicks = [
+            LinkClick(link=self.link, clicked_at=now, country_code='ID', device_type=DeviceType.MOBILE),
+            LinkClick(link=self.link, clicked_at=now, country_code='ID', device_type=DeviceType.MOBILE),
+            LinkClick(link=self.link, clicked_at=now, country_code='US', device_type=DeviceType.DESKTOP),
+            # No device type counts as Unknown.
+            LinkClick(link=self.link, clicked_at=now, device_type=None),
+            LinkClick(link=self.link, clicked_at=now, device_type=DeviceType.UNKNOWN),
+            LinkClick(link=self.link, clicked_at=now - timedelta(days=1), country_code='ID',
+                      device_type=DeviceType.MOBILE, weight=10),
+        ]
+
+    def rollups(self):
+        return set(
+            LinkClickRollup.objects.filter(link=self.link)
+            .values_list('date', 'country_code', 'device_type', 'count')
+        )
+
+    def test_increments_accumulate(self):
+        increment_rollups(self.clicks[:5])
+        increment_rollups(self.clicks[:1])
+        today = timezone.localdate()
+        self.assertEqual(self.rollups(), {
+            (today, 'ID', DeviceType.MOBILE, 3),
+            (today, 'US', DeviceType.DESKTOP, 1),
+            (today, '', DeviceType.UNKNOWN, 2),
+        })
+
+    def test_rebuild_from_raw_clicks(self):
+        LinkClick.objects.bulk_create(self.clicks)
+        other = Link.objects.create(long_url='https://example.org/')
+        LinkClickRollup.objects.create(link=self.link, date=timezone.localdate(), count=99)
+        LinkClickRollup.objects.create(link=other, date=timezone.localdate(), count=7)
+
+        out = io.StringIO()
+        call_command('rebuild_rollups', self.link.short_code, stdout=out)
+        self.assertIn("Rebuilt 4 rollup rows for 1 links.", out.getvalue())
+        today = timezone.localdate()
+        self.assertEqual(self.rollups(), {
+            (today, 'ID', DeviceType.MOBILE, 2),
+            (today, 'US', DeviceType.DESKTOP, 1),
+            (today, '', DeviceType.UNKNOWN, 2),
+            # Sampled clicks count for their weight.
+            (today - timedelta(days=1), 'ID', DeviceType.MOBILE, 10),
+        })
+        self.assertEqual(LinkClickRollup.objects.get(link=other).count, 7)
+
+        with self.assertRaisesMessage(CommandError, "Unknown short codes: missing1"):
+            call_command('rebuild_rollups', 'missing1', stdout=out)
+
+
+class LinkBatchTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    @override_settings(RATE_LIMITS={**settings.RATE_LIMITS, 'create': {'CAPACITY': 100, 'INTERVAL': 60}})
+    def test_operations_report_per_item_results(self):
+        mine = Link.objects.create(long_url='https://example.com/mine', created_by=self.user)
+        gone = Link.objects.create(long_url='https://example.com/gone', created_by=self.user)
+        later = Link.objects.create(long_url='https://example.com/later', created_by=self.user)
+        other = Link.objects.create(long_url='https://example.com/other')
+        expires_at = timezone.now() + timedelta(days=90)
+        operations = [
+            {'op': 'create', 'long_url': f'https://example.com/new/{i}'} for i in range(50)
+        ] + [
+            {'op': 'create', 'long_url': 'ftp://example.com/'},
+            {'op': 'deactivate', 'short_code': mine.short_code},
+            {'op': 'delete', 'short_code': gone.short_code},
+            {'op': 'extend', 'short_code': later.short_code, 'expires_at': expires_at.isoformat()},
+            {'op': 'deactivate', 'short_code': other.short_code},
+        ]
+        # A fixed number of queries per chunk and operation type, however many
+        # links are created: the deletes cascade over the click tables.
+        with self.assertMaxQueries(20):
+            response = self.client.post('/api/links/batch/', {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, 200)
+        statuses = [result['status'] for result in response.data['results']]
+        self.assertEqual(statuses, ['created'] * 50 + ['error', 'updated', 'deleted', 'updated', 'error'])
+
+        self.assertEqual(Link.objects.filter(created_by=self.user, long_url__contains='/new/').count(), 50)
+        self.assertFalse(Link.objects.get(pk=mine.pk).is_active)
+        self.assertFalse(Link.objects.filter(pk=gone.pk).exists())
+        self.assertEqual(Link.objects.get(pk=later.pk).expires_at, expires_at)
+        self.assertTrue(Link.objects.get(pk=other.pk).is_active)
+
+    def test_created_codes_drop_cached_misses(self):
+        link_cache.clear()
+        self.assertIsNone(link_cache.resolve('batch123'))
+        operations = [{'op': 'create', 'long_url': 'https://example.com/'}]
+        with mock.patch('app.batch.allocate_short_codes', return_value=['batch123']):
+            response = self.client.post('/api/links/batch/', {'operations': operations}, format='json')
+        self.assertEqual(response.data['results'][0]['short_code'], 'batch123')
+        self.assertEqual(link_cache.resolve('batch123').long_url, 'https://example.com/')
+
+    @override_settings(RATE_LIMITS={**settings.RATE_LIMITS, 'create': {'CAPACITY': 5, 'INTERVAL': 60}})
+    def test_each_create_takes_a_rate_limit_token(self):
+        def batch(count):
+            operations = [{'op': 'create', 'long_url': f'https://example.com/{i}'} for i in range(count)]
+            return self.client.post('/api/links/batch/', {'operations': operations}, format='json')
+
+        self.assertEqual(batch(3).status_code, 200)
+        self.assertEqual(batch(3).status_code, 429)
+        self.assertEqual(self.client.post('/api/links/', {'long_url': 'https://example.com/'}).status_code, 201)
+        self.assertEqual(Link.objects.filter(created_by=self.user).count(), 4)
+
+
+class LinkDedupeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_dedupe_returns_existing_link_for_same_destination(self):
+        first = self.client.post('/api/links/?dedupe=true', {'long_url': 'https://Example.com:443/a'}, format='json')
+        again = self.client.post('/api/links/?dedupe=true', {'long_url': 'https://example.com/a#top'}, format='json')
+        self.assertEqual((first.status_code, again.status_code), (201, 200))
+        self.assertEqual(first.data['short_code'], again.data['short_code'])
+
+        other = self.client.post('/api/links/', {'long_url': 'https://example.com/a'}, format='json')
+        self.assertEqual(other.status_code, 201)
+        response = self.client.get('/api/links/', {'long_url': 'https://EXAMPLE.com/a'})
+        self.assertEqual(
+            {link['short_code'] for link in response.data['results']},
+            {first.data['short_code'], other.data['short_code']},
+        )
+
+
+class ShortCodeTests(TestCase):
+    def decode(self, code):
+        return sum(BASE62_ALPHABET.index(char) * 62 ** i for i, char in enumerate(reversed(code)))
+
+    def test_base62(self):
+        self.assertEqual([base62_encode(n) for n in (0, 61, 62, 62 ** 3)], ['0', 'Z', '10', '1000'])
+
+    def test_sequence_blocks(self):
+        generator = SequenceShortCodeGenerator(block_size=3)
+        with mock.patch.object(generator, 'reserve', wraps=generator.reserve) as reserve:
+            codes = generator.generate_many(5) + [generator.generate(), generator.generate()]
+        # One block big enough for the batch, then a regular one.
+        self.assertEqual([call.args for call in reserve.call_args_list], [(5,), (3,)])
+        first = self.decode(codes[0])
+        self.assertGreaterEqual(first, SequenceShortCodeGenerator.start)
+        self.assertEqual(codes, [base62_encode(n) for n in range(first, first + 7)])
+        self.assertEqual(ShortCodeSequence.objects.get(name='link').next_value, first + 8)
+
+        # Other processes, and children forked after a block was reserved, get blocks of their own.
+        other = SequenceShortCodeGenerator(block_size=3).generate()
+        with mock.patch('app.shortcodes.os.getpid', return_value=-1):
+            forked = generator.generate()
+        self.assertEqual((self.decode(other), self.decode(forked)), (first + 8, first + 11))
+
+    def test_configured_strategy(self):
+        conf = {**settings.SHORT_CODE_GENERATOR, 'STRATEGY': 'sequence'}
+        with mock.patch.dict('app.shortcodes._generators', clear=True), \
+                override_settings(SHORT_CODE_GENERATOR=conf):
+            generator = get_short_code_generator()
+            self.assertIsInstance(generator, SequenceShortCodeGenerator)
+            self.assertIs(get_short_code_generator(), generator)
+            link = Link.objects.create(long_url='https://example.com/')
+        self.assertEqual(
+            self.decode(link.short_code) + conf['OPTIONS']['block_size'],
+            ShortCodeSequence.objects.get(name='link').next_value,
+        )
+
+    def test_save_retries_collisions(self):
+        Link.objects.create(long_url='https://example.com/', short_code='taken123')
+        generator = mock.Mock()
+        generator.generate.side_effect = ['taken123', 'taken123', 'fresh123']
+        with mock.patch('app.models.get_short_code_generator', return_value=generator):
+            link = Link.objects.create(long_url='https://example.org/')
+        self.assertEqual(link.short_code, 'fresh123')
+
+        generator.generate.side_effect = None
+        generator.generate.return_value = 'taken123'
+        link = Link(long_url='https://example.net/')
+        with mock.patch('app.models.get_short_code_generator', return_value=generator), \
+                self.assertRaisesMessage(IntegrityError, "after 5 attempts"):
+            link.save()
+        self.assertEqual((link.short_code, link.pk), ('', None))
+
+
+class LinkReadSerializerTests(TestCase):
+    def test_matches_link_serializer_and_json_renderer(self):
+        user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        links = [
+            Link.objects.create(long_url='https://example.com/a', title='Line\u2028break', created_by=user),
+            Link.objects.create(
+                long_url='https://example.com/b', expires_at=timezone.now() - timedelta(days=1)
+            ),
+        ]
+        context = {'request': Request(APIRequestFactory().get('/api/links/'))}
+        expected = LinkSerializer(links, many=True, context=context).data
+        self.assertEqual(LinkReadSerializer(links, many=True, context=context).data, expected)
+        self.assertEqual(
+            LinkReadSerializer(links, many=True, context=context, fields=['short_url', 'is_expired']).data,
+            [{'short_url': link['short_url'], 'is_expired': link['is_expired']} for link in expected],
+        )
+
+        payload = {'results': expected, 'clicks_by_day': [{'date': timezone.localdate(), 'count': 3}]}
+        self.assertEqual(FastJSONRenderer().render(payload), JSONRenderer().render(payload))
+
+
+@override_settings(LINK_EXPIRY_SWEEP={**settings.LINK_EXPIRY_SWEEP, 'INTERVAL': 60, 'CHUNK_SIZE': 2})
+class ExpirySweepTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        link_cache.clear()
+        past = timezone.now() - timedelta(minutes=1)
+        self.expired = [Link.objects.create(long_url=f'https://example.com/{i}', expires_at=past) for i in range(5)]
+        self.live = Link.objects.create(long_url='https://example.com/live')
+
+    def test_sweep_deactivates_expired_links_once_per_interval(self):
+        self.assertEqual(self.client.get(f'/r/{self.expired[0].short_code}/').status_code, 410)
+
+        sweeper = ExpirySweeper()
+        self.assertEqual(sweeper.run_once(), 5)
+        self.assertEqual(sweeper.run_once(), 0)
+        self.assertEqual(set(Link.objects.filter(is_active=True)), {self.live})
+
+        response = self.client.get(f'/r/{self.expired[0].short_code}/')
+        self.assertEqual(response.json(), {'error': "This short URL has expired"})
+
+    def test_extending_a_swept_link_reactivates_it(self):
+        user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        Link.objects.filter(pk__in=[link.pk for link in self.expired]).update(created_by=user)
+        Link.objects.filter(pk=self.expired[4].pk).update(is_active=False)
+        self.assertEqual(sweep_expired_links(), 4)
+
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get('/api/links/?expired=true')
+        self.assertEqual(
+            {link['short_code'] for link in response.data['results']},
+            {link.short_code for link in self.expired[:4]},
+        )
+
+        expires_at = (timezone.now() + timedelta(days=30)).isoformat()
+        client.patch(f'/api/links/{self.expired[0].short_code}/', {'expires_at': expires_at}, format='json')
+        client.patch(
+            f'/api/links/{self.expired[1].short_code}/', {'expires_at': expires_at, 'is_active': False}, format='json'
+        )
+        operations = [
+            {'op': 'extend', 'short_code': link.short_code, 'expires_at': expires_at}
+            for link in (self.expired[2], self.expired[4])
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            client.post('/api/links/batch/', {'operations': operations}, format='json')
+        # MySQL assigns left to right, so the CASE must read swept_at before it is cleared.
+        [update] = [query['sql'] for query in queries if query['sql'].startswith('UPDATE')]
+        quote = connection.ops.quote_name
+        self.assertLess(update.index(f"{quote('is_active')} = CASE"), update.index(f"{quote('swept_at')} = NULL"))
+
+        self.assertEqual(
+            [Link.objects.get(pk=link.pk).is_active for link in self.expired], [True, False, True, False, False]
+        )
+        self.assertEqual(self.client.get(f'/r/{self.expired[0].short_code}/').status_code, 302)
+        click_buffer.flush()
+        # Owner deactivations and links extended again are not swept links any more.
+        self.assertEqual(
+            set(Link.objects.filter(swept_at__isnull=False).values_list('pk', flat=True)), {self.expired[3].pk}
+        )
+
+    def test_scheduler_needs_a_shared_cache(self):
+        with self.assertRaises(ImproperlyConfigured):
+            ExpirySweeper().start()
+
+
+class TransferCommandTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.links = [
+            Link.objects.create(long_url=f'https://example.com/{i}', title=f'Link {i}', created_by=self.user)
+            for i in range(5)
+        ]
+        LinkClick.objects.create(link=self.links[0], country_code='ID', device_type=DeviceType.MOBILE)
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def call(self, *args):
+        stderr = io.StringIO()
+        call_command(*args, stderr=stderr)
+        return stderr.getvalue()
+
+    def test_links_round_trip_through_gzipped_csv(self):
+        path = os.path.join(self.directory.name, 'links.csv.gz')
+        # Five links read in batches of two.
+        self.call('export_links', '--output', path, '--chunk-size', '2')
+        created = {link.short_code: link.created_at for link in self.links}
+        Link.objects.all().delete()
+
+        self.call('import_links', path, '--chunk-size', '2')
+        self.assertEqual(
+            {link.short_code: link.created_at for link in Link.objects.filter(created_by=self.user)}, created
+        )
+
+        # Existing short codes are skipped unless --update is given.
+        with gzip.open(path, 'rt') as source:
+            rows = source.read().replace('https://example.com/', 'https://example.org/')
+        with gzip.open(path, 'wt') as target:
+            target.write(rows)
+        output = self.call('import_links', path)
+        self.assertIn('Imported links: 0 rows', output)
+        self.assertIn('Skipped 5 existing short codes', output)
+        self.assertFalse(Link.objects.filter(long_url__startswith='https://example.org/').exists())
+        output = self.call('import_links', path, '--update')
+        self.assertIn('Imported links: 5 rows', output)
+        self.assertEqual(Link.objects.filter(long_url__startswith='https://example.org/').count(), 5)
+
+    def test_export_clicks_as_ndjson(self):
+        path = os.path.join(self.directory.name, 'clicks.ndjson')
+        self.call('export_clicks', '--output', path, '--format', 'ndjson')
+        with open(path) as source:
+            rows = [json.loads(line) for line in source]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual((rows[0]['short_code'], rows[0]['device_type']), (self.links[0].short_code, 'Mobile'))
+
+
+@override_settings(DATABASE_REPLICAS=['replica1', 'replica2'])
+class ReplicaRouterTests(SimpleTestCase):
+    def test_reads_leave_replicas_after_a_write(self):
+        router = PrimaryReplicaRouter()
+        with primary_pin():
+            self.assertIn(router.db_for_read(Link), {'replica1', 'replica2'})
+            self.assertEqual(router.db_for_write(Link), 'default')
+            self.assertEqual(router.db_for_read(Link), 'default')
+
+        with primary_pin():
+            self.assertIn(router.db_for_read(Link), {'replica1', 'replica2'})
+        with primary_pin(True):
+            self.assertEqual(router.db_for_read(Link), 'default')
+
+    def test_migrations_only_on_primary(self):
+        router = PrimaryReplicaRouter()
+        self.assertTrue(router.allow_migrate('default', 'app'))
+        self.assertFalse(router.allow_migrate('replica1', 'app'))
+
+
+class LinkResolutionCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        link_cache.clear()
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'pw')
+        self.link = Link.objects.create(long_url='https://example.com/', created_by=self.user)
+
+    def resolve(self, short_code):
+        before = link_cache.stats()
+        link = link_cache.resolve(short_code)
+        after = link_cache.stats()
+        tiers = ('local_hits', 'shared_hits', 'misses', 'negative_hits')
+        return link, {tier: after[tier] - before[tier] for tier in tiers if after[tier] != before[tier]}
+
+    def test_tiers(self):
+        with self.assertNumQueries(1):
+            link, counted = self.resolve(self.link.short_code)
+        self.assertEqual((link.long_url, link.id), (self.link.long_url, self.link.id))
+        self.assertEqual(counted, {'misses': 1})
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.resolve(self.link.short_code)[1], {'local_hits': 1})
+            # Another process only shares the Django cache.
+            link_cache.clear()
+            self.assertEqual(self.resolve(self.link.short_code)[1], {'shared_hits': 1})
+
+    def test_missing_codes_are_cached(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.resolve('missing1'), (None, {'misses': 1, 'negative_hits': 1}))
+            self.assertEqual(self.resolve('missing1'), (None, {'local_hits': 1, 'negative_hits': 1}))
+        self.assertEqual(cache.get(link_cache.make_key('missing1')), NEGATIVE)
+
+    def test_updates_invalidate(self):
+        link_cache.resolve(self.link.short_code)
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.patch(
+            f'/api/links/{self.link.short_code}/', {'long_url': 'https://example.org/'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        link, counted = self.resolve(self.link.short_code)
+        self.assertEqual((link.long_url, counted), ('https://example.org/', {'misses': 1}))
+
+        client.delete(f'/api/links/{self.link.short_code}/')
+        self.assertIsNone(link_cache.resolve(self.link.short_code))
+
+    def test_local_tier_is_bounded(self):
+        local = LocalLRU(maxsize=2, ttl=60)
+        local.set('a', 1)
+        local.set('b', 2)
+        local.get('a')
+        local.set('c', 3)
+        self.assertEqual((local.get('a'), local.get('b'), local.get('c')), (1, None, 3))
+        self.assertEqual(local.evictions, 1)
+
+        with mock.patch('app.cache.time.monotonic', return_value=time.monotonic() + 61):
+            self.assertIsNone(local.get('a'))
+
+
+class ReplicaResolutionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        link_cache.clear()
+
+    def test_replica_miss_is_confirmed_on_primary(self):
+        link = Link.objects.create(long_url='https://example.com/')
+        first = QuerySet.first
+        reads = []
+
+        def lagging_first(queryset):
+            reads.append(queryset.db)
+            # The replica hasn't caught up with the new link yet.
+            return None if queryset.db == 'replica1' else first(queryset)
+
+        with mock.patch.object(PrimaryReplicaRouter, 'db_for_read', return_value='replica1'), \
+                mock.patch.object(QuerySet, 'first', autospec=True, side_effect=lagging_first):
+            self.assertEqual(link_cache.resolve(link.short_code).long_url, link.long_url)
+            self.assertIsNone(link_cache.resolve('missing1'))
+        self.assertEqual(reads, ['replica1', 'default', 'replica1', 'default'])
+        self.assertEqual(cache.get(link_cache.make_key('missing1')), NEGATIVE)
+
+
+class BenchmarkHelperTests(TestCase):
+    def test_summarize(self):
+        latencies = [i / 1000 for i in range(100, 0, -1)]
+        self.assertEqual(summarize(latencies, 2.0), {
+            'requests': 100, 'seconds': 2.0, 'requests_per_second': 50.0,
+            'p50_ms': 51.0, 'p95_ms': 95.0, 'p99_ms': 99.0,
+        })
+        self.assertEqual(percentile([], 0.5), 0.0)
+        self.assertEqual(summarize([], 0)['requests_per_second'], 0.0)
+
+    def test_zipf_sampler(self):
+        ranks = ZipfSampler(50, seed=7).sample(2000)
+        self.assertEqual(ranks, ZipfSampler(50, seed=7).sample(2000))
+        self.assertTrue(set(ranks) <= set(range(50)))
+        # The head is much hotter than the tail.
+        self.assertGreater(ranks.count(0), 10 * ranks.count(49))
+
+    def test_seed(self):
+        links, _ = seed(links=10, clicks=300)
+        self.assertEqual(LinkClick.objects.count(), 300)
+        self.assertEqual(Link.objects.aggregate(total=Sum('click_count'))['total'], 300)
+        for link in Link.objects.filter(id__in=[link.id for link in links]):
+            rolled_up = LinkClickRollup.objects.filter(link=link).aggregate(total=Sum('count'))['total']
+            self.assertEqual(rolled_up or 0, link.click_count)
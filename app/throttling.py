@@ -0,0 +1,202 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from rest_framework import status
+from rest_framework.exceptions import Throttled
+from rest_framework.throttling import BaseThrottle
+
+from .authentication import CachedHasAPIKey
+from .metrics import RATE_LIMITED
+from .utils import get_client_ip
+
+
+class FixedWindowLimit:
+    """
+    Fixed-window request counter kept in the shared Django cache.
+
+    Allows ``capacity`` units per window of ``interval`` seconds, windows being
+    aligned to multiples of ``interval``. Each window is its own cache key,
+    created with ``add`` and counted up with ``incr``, both atomic on Redis and
+    Memcached, so every worker process shares the same counters without
+    locking. As with any fixed window, a client can use a full window's
+    capacity just before a boundary and again just after it: up to twice
+    ``capacity`` within ``interval`` seconds.
+    """
+
+    def __init__(self, scope, capacity, interval, alias='default'):
+        self.scope = scope
+        self.capacity = capacity
+        self.interval = interval
+        self.alias = alias
+
+    @classmethod
+    def from_settings(cls, scope):
+        conf = settings.RATE_LIMITS
+        policy = conf[scope]
+        return cls(scope, policy['CAPACITY'], policy['INTERVAL'], conf['ALIAS'])
+
+    @property
+    def enabled(self):
+        return self.capacity > 0 and self.interval > 0
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def make_key(self, ident, now):
+        window = int(now // self.interval)
+        return f'ratelimit:{self.scope}:{ident}:{window}', (window + 1) * self.interval - now
+
+    def consume(self, ident, cost=1):
+        """Count ``cost`` units against the window; returns (allowed, seconds until it ends)."""
+        if not self.enabled:
+            return True, 0
+        key, wait = self.make_key(ident, time.time())
+        self.cache.add(key, 0, self.interval + 1)
+        try:
+            used = self.cache.incr(key, cost)
+        except ValueError:
+            # Evicted between add and incr.
+            self.cache.set(key, cost, self.interval + 1)
+            used = cost
+        allowed, wait = self.settle(used, wait)
+        if not allowed:
+            # Rejected requests give their units back, so one oversized batch
+            # doesn't use up the window for later, smaller requests.
+            try:
+                self.cache.decr(key, cost)
+            except ValueError:
+                pass
+        return allowed, wait
+
+    async def aconsume(self, ident, cost=1):
+        if not self.enabled:
+            return True, 0
+        key, wait = self.make_key(ident, time.time())
+        await self.cache.aadd(key, 0, self.interval + 1)
+        try:
+            used = await self.cache.aincr(key, cost)
+        except ValueError:
+            await self.cache.aset(key, cost, self.interval + 1)
+            used = cost
+        allowed, wait = self.settle(used, wait)
+        if not allowed:
+            try:
+                await self.cache.adecr(key, cost)
+            except ValueError:
+                pass
+        return allowed, wait
+
+    def settle(self, used, wait):
+        if used <= self.capacity:
+            return True, 0
+        RATE_LIMITED.inc(self.scope)
+        return False, wait
+
+
+def ip_limits_enabled():
+    # Until TRUSTED_PROXY_COUNT says where the client address comes from, a
+    # proxied deployment would key every client on the proxy's address.
+    return settings.TRUSTED_PROXY_COUNT is not None
+
+
+def get_client_ident(request):
+    # API key clients get their own counter, so partners behind one NAT don't
+    # share a limit; the key itself never ends up in a cache key.
+    api_key = CachedHasAPIKey.key_parser.get(request)
+    if api_key:
+        return 'key:' + hashlib.sha256(api_key.encode()).hexdigest()[:32]
+    return 'ip:' + (get_client_ip(request) or 'unknown')
+
+
+def redirect_windows():
+    return FixedWindowLimit.from_settings('redirect'), FixedWindowLimit.from_settings('redirect_link')
+
+
+def redirect_limits(request, short_code):
+    if not ip_limits_enabled():
+        return ()
+    ip = get_client_ip(request) or 'unknown'
+    per_ip, per_link = redirect_windows()
+    return ((per_ip, ip), (per_link, f'{ip}:{short_code}'))
+
+
+def check_redirect_limits(request, short_code):
+    """Returns seconds to wait when the redirect must be rejected, else None."""
+    for limit, ident in redirect_limits(request, short_code):
+        allowed, wait = limit.consume(ident)
+        if not allowed:
+            return wait
+    return None
+
+
+async def acheck_redirect_limits(request, short_code):
+    for limit, ident in redirect_limits(request, short_code):
+        allowed, wait = await limit.aconsume(ident)
+        if not allowed:
+            return wait
+    return None
+
+
+def throttled_response(wait):
+    # Same body and Retry-After header DRF sends for a Throttled exception.
+    exc = Throttled(wait)
+    response = JsonResponse({"detail": exc.detail}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+    response['Retry-After'] = '%d' % exc.wait
+    return response
+
+
+class LinkCreateThrottle(BaseThrottle):
+    """Limits POST /api/links/ per user, per API key, or per client IP."""
+
+    scope = 'create'
+
+    def allow_request(self, request, view):
+        if request.method != 'POST':
+            return True
+        if request.user and request.user.is_authenticated:
+            ident = f'user:{request.user.pk}'
+        else:
+            ident = get_client_ident(request)
+            if ident.startswith('ip:') and not ip_limits_enabled():
+                return True
+        limit = FixedWindowLimit.from_settings(self.scope)
+        allowed, self.wait_seconds = limit.consume(ident, cost=self.get_cost(request))
+        return allowed
+
+    def get_cost(self, request):
+        return 1
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class LinkBatchThrottle(LinkCreateThrottle):
+    """
+    Applies the "create" limit to POST /api/links/batch/, one unit per create
+    operation, so a batch can't create more links than separate requests could.
+    """
+
+    def get_cost(self, request):
+        operations = request.data.get('operations') if isinstance(request.data, dict) else None
+        if not isinstance(operations, list):
+            return 1
+        creates = sum(
+            1 for operation in operations
+            if isinstance(operation, dict) and operation.get('op') == 'create'
+        )
+        return max(creates, 1)
+
+
+class RedirectThrottle(BaseThrottle):
+    """Limits /r/<short_code>/ per client IP and per client IP and link."""
+
+    def allow_request(self, request, view):
+        self.wait_seconds = check_redirect_limits(request, view.kwargs.get('short_code', ''))
+        return self.wait_seconds is None
+
+    def wait(self):
+        return self.wait_seconds
@@ -1,17 +1,47 @@
 from user_agents import parse
 import geoip2.database
+import geoip2.errors
+import hashlib
+import ipaddress
 import os
+import re
+import threading
+import time
+from collections import namedtuple
+from functools import lru_cache
+from urllib.parse import urlsplit, urlunsplit
 from django.conf import settings
+from maxminddb import MODE_MMAP, MODE_MMAP_EXT
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+def normalize_url(url):
+    # Only rewrites what never changes the destination: scheme and host case,
+    # default ports, an empty path and the fragment. Stored Link.url_hash
+    # values depend on it: a change here needs a migration that re-hashes them.
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+        host = parts.hostname or ''
+        port = parts.port
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+    userinfo, _, _ = parts.netloc.rpartition('@')
+    netloc = f'[{host}]' if ':' in host else host
+    if port is not None and port != DEFAULT_PORTS.get(scheme):
+        netloc = f'{netloc}:{port}'
+    if userinfo:
+        netloc = f'{userinfo}@{netloc}'
+    return urlunsplit((scheme, netloc, parts.path or '/', parts.query, ''))
+
+def url_hash(url):
+    return hashlib.sha256(normalize_url(url).encode()).hexdigest()
 
 def anonymize_ip(ip):
     if not ip:
         return None
-    
-    if '.' in ip:  # IPv4
-        return '.'.join(ip.split('.')[:3]) + '.0'
-    elif ':' in ip:  # IPv6
-        return ':'.join(ip.split(':')[:4]) + '::'
-    return ip
+    return ip_prefix(ip)
 
 def parse_user_agent(user_agent_str):
     if not user_agent_str:
@@ -41,12 +71,78 @@ def parse_user_agent(user_agent_str):
         'is_bot': ua.is_bot
     }
 
+UserAgentClass = namedtuple('UserAgentClass', ['device_type', 'is_bot'])
+
+UNKNOWN_USER_AGENT = UserAgentClass('Unknown', False)
+BOT_USER_AGENT = UserAgentClass('Bot', True)
+
+# Obvious automated clients are classified without running the ua-parser regexes.
+# "bot" only counts as a crawler name when followed by a version, a separator
+# or the end ("Googlebot/2.1", "PetalBot;", "(like TwitterBot)"), or when on
+# its own; device names such as "CUBOT X19" must not match. "+http://..." is
+# the contact URL crawlers put in their User-Agent.
+BOT_USER_AGENT_RE = re.compile(
+    r'bot(?:[/;@)-]|\.html|$)|\bbot\b|\+https?://|crawl|spider|slurp|curl|wget|'
+    r'python-requests|python-urllib|httpclient|go-http-client|okhttp|headless|scrapy|facebookexternalhit',
+    re.IGNORECASE,
+)
+
+# Parsing only looks at the start of the string; the cap bounds cache memory.
+USER_AGENT_KEY_LENGTH = 512
+
+_user_agent_fast_path = 0
+
+@lru_cache(maxsize=settings.USER_AGENT_CACHE_SIZE)
+def _classify_user_agent(user_agent_str):
+    ua = parse(user_agent_str)
+
+    if ua.is_mobile:
+        device_type = 'Mobile'
+    elif ua.is_tablet:
+        device_type = 'Tablet'
+    elif ua.is_pc:
+        device_type = 'Desktop'
+    elif ua.is_bot:
+        device_type = 'Bot'
+    else:
+        device_type = 'Other'
+    return UserAgentClass(device_type, ua.is_bot)
+
+def classify_user_agent(user_agent_str):
+    global _user_agent_fast_path
+
+    if not user_agent_str:
+        _user_agent_fast_path += 1
+        return UNKNOWN_USER_AGENT
+    user_agent_str = user_agent_str[:USER_AGENT_KEY_LENGTH]
+    if BOT_USER_AGENT_RE.search(user_agent_str):
+        _user_agent_fast_path += 1
+        return BOT_USER_AGENT
+    return _classify_user_agent(user_agent_str)
+
+def user_agent_cache_stats():
+    info = _classify_user_agent.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        'hits': info.hits,
+        'misses': info.misses,
+        'fast_path': _user_agent_fast_path,
+        'size': info.currsize,
+        'maxsize': info.maxsize,
+        'hit_rate': info.hits / lookups if lookups else 0.0,
+    }
+
 def get_client_ip(request):
+    # Only the X-Forwarded-For entries our own proxies appended can be trusted:
+    # the client is the one just before them. Anything further left was sent
+    # by the client and would let it pick its own rate limit key.
+    ip = request.META.get('REMOTE_ADDR')
+    proxies = settings.TRUSTED_PROXY_COUNT or 0
     x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-    if x_forwarded_for:
-        ip = x_forwarded_for.split(',')[0]
-    else:
-        ip = request.META.get('REMOTE_ADDR')
+    if proxies > 0 and x_forwarded_for:
+        forwarded = [part.strip() for part in x_forwarded_for.split(',') if part.strip()]
+        if forwarded:
+            ip = forwarded[-min(proxies, len(forwarded))]
 
     # For testing purposes, if the IP is localhost, use a public IP
     if ip == '127.0.0.1':
@@ -56,22 +152,120 @@ def get_client_ip(request):
 
 GEOIP_DATABASE_PATH = os.path.join(settings.BASE_DIR, 'app', 'data', 'GeoLite2-Country.mmdb')
 
-try:
-    if os.path.exists(GEOIP_DATABASE_PATH):
-        GEOIP_READER = geoip2.database.Reader(GEOIP_DATABASE_PATH)
+# Opened on first use rather than at import, so management commands and workers
+# that never look up a country don't pay for it. The database is memory-mapped:
+# forked workers share the page cache instead of each holding a private copy.
+_geoip_lock = threading.Lock()
+_geoip_reader = None
+# The file the reader was opened from; reload checks watch this one.
+_geoip_path = GEOIP_DATABASE_PATH
+_geoip_mtime = None
+_geoip_checked_at = None
+
+# Country names as reported by the database, keyed by ISO code.
+COUNTRY_NAMES = {}
+
+def _open_geoip_reader(path):
+    try:
+        return geoip2.database.Reader(path, mode=MODE_MMAP_EXT)
+    except ValueError:
+        # The C extension isn't available; fall back to the pure-Python mmap reader.
+        return geoip2.database.Reader(path, mode=MODE_MMAP)
+
+def reload_geoip_database(path=None):
+    """
+    Swap in the database at ``path`` (default: the configured one) and drop
+    cached lookups. If it can't be opened the current reader stays in place.
+    Later checks watch ``path`` for changes, not the configured file.
+    """
+    global _geoip_reader, _geoip_path, _geoip_mtime, _geoip_checked_at
+
+    path = path or GEOIP_DATABASE_PATH
+    with _geoip_lock:
+        _geoip_checked_at = time.monotonic()
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return False
+        if path == _geoip_path:
+            # A broken file isn't retried until it changes again.
+            _geoip_mtime = mtime
+        try:
+            reader = _open_geoip_reader(path)
+        except Exception:
+            return False
+        # The old reader is left to the garbage collector so lookups already
+        # running against it can finish.
+        _geoip_reader, _geoip_path, _geoip_mtime = reader, path, mtime
+        _lookup_country_code.cache_clear()
+    return True
+
+def get_geoip_reader():
+    global _geoip_checked_at
+
+    now = time.monotonic()
+    if _geoip_checked_at is not None and now - _geoip_checked_at < settings.GEOIP_RELOAD_CHECK_INTERVAL:
+        return _geoip_reader
+
+    # Pick up a replaced .mmdb without restarting the process.
+    path = _geoip_path
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        mtime = None
+    if _geoip_checked_at is None or mtime != _geoip_mtime:
+        reload_geoip_database(path)
     else:
-        GEOIP_READER = None
-except Exception:
-    GEOIP_READER = None
+        _geoip_checked_at = now
+    return _geoip_reader
 
-def get_country_from_ip(ip):
-    if not ip or not GEOIP_READER:
+def ip_prefix(ip):
+    """Network address of the /24 (IPv4) or /64 (IPv6) containing ``ip``, or None."""
+    try:
+        address = ipaddress.ip_address(ip.strip())
+    except (AttributeError, ValueError):
+        return None
+    prefix = 24 if address.version == 4 else 64
+    return str(ipaddress.ip_network(f'{address}/{prefix}', strict=False).network_address)
+
+@lru_cache(maxsize=settings.GEOIP_CACHE_SIZE)
+def _lookup_country_code(prefix):
+    reader = _geoip_reader
+    if reader is None:
         return None
 
     try:
-        response = GEOIP_READER.country(ip)
-        return response.country.name
+        country = reader.country(prefix).country
     except geoip2.errors.AddressNotFoundError:
         return None
     except Exception:
-        return None
\ No newline at end of file
+        return None
+    if country.iso_code:
+        COUNTRY_NAMES.setdefault(country.iso_code, country.name)
+    return country.iso_code
+
+def get_country_code_from_ip(ip):
+    # Clicks are anonymized to the same prefix, so one lookup serves the whole
+    # network and the cache stays small.
+    prefix = ip_prefix(ip)
+    if not prefix or get_geoip_reader() is None:
+        return None
+    return _lookup_country_code(prefix)
+
+def get_country_from_ip(ip):
+    code = get_country_code_from_ip(ip)
+    if not code:
+        return None
+    return COUNTRY_NAMES.get(code)
+
+def geoip_cache_stats():
+    info = _lookup_country_code.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        'hits': info.hits,
+        'misses': info.misses,
+        'size': info.currsize,
+        'maxsize': info.maxsize,
+        'hit_rate': info.hits / lookups if lookups else 0.0,
+        'loaded': _geoip_reader is not None,
+    }
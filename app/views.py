@@ -1,49 +1,178 @@
+import hashlib
 from rest_framework import generics, status, permissions
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from django.shortcuts import get_object_or_404
-from django.http import HttpResponseRedirect
+from django.conf import settings
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.db.models import Count, Max, Q
 from django.utils import timezone
-from django.db.models import Count, F
-from django.db.models.functions import TruncDate
-from datetime import timedelta
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.crypto import constant_time_compare
+from django.utils.http import quote_etag
+from django.shortcuts import get_object_or_404
 from .models import Link, LinkClick
-from .serializers import LinkSerializer, LinkAnalyticsSerializer, RegisterSerializer
-from .utils import anonymize_ip, parse_user_agent, get_client_ip, get_country_from_ip
+from .authentication import CachedHasAPIKey
+from .analytics import account_summary, clicks_by_day, clicks_by_country, clicks_by_device, unique_visitors
+from .batch import LinkBatch
+from .cache import link_cache
+from .ingest import click_buffer
+from .metrics import registry
+from .exports import (
+    CLICK_EXPORT_COLUMNS, CLICK_EXPORT_FIELDS, EXPORT_CONTENT_TYPES, iter_click_rows, iter_export, iter_keyset,
+)
+from .redirects import (
+    LINK_NOT_FOUND_MESSAGE, aserve_redirect, build_click_record, build_redirect_response,
+    get_unavailable_reason, purge_link_caches,
+)
+from .pagination import ClickCursorPagination, LinkCursorPagination
+from .serializers import LinkSerializer, LinkAnalyticsSerializer, LinkClickSerializer, LinkReadSerializer, RegisterSerializer
+from .throttling import LinkBatchThrottle, LinkCreateThrottle, RedirectThrottle
 from .permissions import IsOwnerOrReadOnly, HasAPIKeyOrIsAuthenticated
+from .utils import url_hash
 from django.contrib.auth.models import User
 from rest_framework_simplejwt.authentication import JWTAuthentication
-from rest_framework_api_key.permissions import HasAPIKey
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = RegisterSerializer
-    permission_classes = [HasAPIKey]
+    permission_classes = [CachedHasAPIKey]
 
 class Login(TokenObtainPairView):
-    permission_classes = [HasAPIKey]
+    permission_classes = [CachedHasAPIKey]
 
 class RefreshToken(TokenRefreshView):
-    permission_classes = [HasAPIKey]
+    permission_classes = [CachedHasAPIKey]
 
 class LinkListCreateView(generics.ListCreateAPIView):
     serializer_class = LinkSerializer
     permission_classes = [HasAPIKeyOrIsAuthenticated]
+    pagination_class = LinkCursorPagination
+    throttle_classes = [LinkCreateThrottle]
 
     def get_queryset(self):
-        queryset = Link.objects.filter(is_active=True)
+        expired = self.request.query_params.get('expired', '')
+        if self.request.method == 'GET' and expired.lower() in ('1', 'true', 'yes'):
+            # Links the expiry sweeper deactivated, for owners to extend.
+            queryset = Link.objects.filter(is_active=False, swept_at__isnull=False)
+        else:
+            queryset = Link.objects.filter(is_active=True)
+
+        long_url = self.request.query_params.get('long_url')
+        if long_url:
+            # Served by link_owner_url_hash_idx together with the owner filter.
+            queryset = queryset.filter(url_hash=url_hash(long_url))
         
         if self.request.user.is_authenticated:
             return queryset.filter(created_by=self.request.user)
         
         return queryset.filter(created_by__isnull=True)
+
+    def should_dedupe(self):
+        value = self.request.query_params.get('dedupe')
+        if value is None:
+            return settings.LINK_DEDUPE
+        return value.lower() in ('1', 'true', 'yes')
+
+    def get_existing_link(self, long_url):
+        return (
+            self.get_queryset()
+            .filter(url_hash=url_hash(long_url))
+            .filter(Q(expires_at__isnull=True) | Q(expires_at__gt=timezone.now()))
+            .order_by('-created_at', '-id')
+            .first()
+        )
+
+    def create(self, request, *args, **kwargs):
+        if not self.should_dedupe():
+            return super().create(request, *args, **kwargs)
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        existing = self.get_existing_link(serializer.validated_data['long_url'])
+        if existing is not None:
+            return Response(self.get_serializer(existing).data, status=status.HTTP_200_OK)
+
+        self.perform_create(serializer)
+        headers = self.get_success_headers(serializer.data)
+        return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+
+    def get_serializer_class(self):
+        if self.request.method == 'GET':
+            return LinkReadSerializer
+        return LinkSerializer
+
+    def get_requested_fields(self):
+        if self.request.method != 'GET' or 'fields' not in self.request.query_params:
+            return None
+        requested = self.request.query_params['fields'].split(',')
+        return [name for name in LinkSerializer.Meta.fields if name in requested]
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_requested_fields()
+        if fields is not None:
+            kwargs['fields'] = fields
+        return super().get_serializer(*args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+
+        # Cheap validator for conditional GETs: a create, edit or click flush
+        # bumps the newest updated_at, and a delete or deactivation drops the
+        # row count. There is no Last-Modified: removing a link other than the
+        # newest leaves the newest updated_at as it was. Links also expire
+        # without being written to (until the sweeper gets to them), so the
+        # number already past expires_at keeps is_expired from going stale.
+        state = queryset.order_by().aggregate(
+            count=Count('id'),
+            expired=Count('id', filter=Q(expires_at__lte=timezone.now())),
+            last_modified=Max('updated_at'),
+        )
+        last_modified = state['last_modified']
+        etag = quote_etag(hashlib.md5(
+            f"{state['count']}:{state['expired']}:{last_modified and last_modified.isoformat()}:"
+            f"{request.get_full_path()}".encode()
+        ).hexdigest())
+
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            fields = self.get_requested_fields()
+            if fields is not None:
+                queryset = queryset.only(*LinkSerializer.model_fields_for(fields))
+            page = self.paginate_queryset(queryset)
+            serializer = self.get_serializer(page, many=True)
+            response = self.get_paginated_response(serializer.data)
+
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Authorization', 'X-API-Key'])
+        return response
     
     def perform_create(self, serializer):
         if self.request.user.is_authenticated:
-            serializer.save(created_by=self.request.user)
+            link = serializer.save(created_by=self.request.user)
         else:
-            serializer.save()
+            link = serializer.save()
+        link_cache.invalidate(link.short_code)
+
+class LinkBatchView(APIView):
+    permission_classes = [HasAPIKeyOrIsAuthenticated]
+    throttle_classes = [LinkBatchThrottle]
+
+    def post(self, request):
+        operations = request.data.get('operations') if isinstance(request.data, dict) else None
+        max_operations = settings.LINK_BATCH['MAX_OPERATIONS']
+        if not isinstance(operations, list) or not operations:
+            return Response(
+                {"error": "Expected a non-empty list of operations."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(operations) > max_operations:
+            return Response(
+                {"error": f"At most {max_operations} operations per request."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response({"results": LinkBatch(request).run(operations)})
 
 class LinkDetailView(generics.RetrieveUpdateDestroyAPIView):
     queryset = Link.objects.all()
@@ -56,45 +185,37 @@ class LinkDetailView(generics.RetrieveUpdateDestroyAPIView):
             return Link.objects.filter(created_by=self.request.user)
         return Link.objects.filter(created_by__isnull=True)
 
+    def perform_update(self, serializer):
+        link = serializer.save()
+        purge_link_caches(link.short_code)
+
+    def perform_destroy(self, instance):
+        short_code = instance.short_code
+        instance.delete()
+        purge_link_caches(short_code)
+
 class LinkRedirectView(APIView):
     authentication_classes = []
     permission_classes = []
+    throttle_classes = [RedirectThrottle]
     
     def get(self, request, short_code):
-        link = get_object_or_404(Link, short_code=short_code)
+        link = link_cache.resolve(short_code)
+        if link is None:
+            raise Http404(LINK_NOT_FOUND_MESSAGE)
         
-        if not link.is_active:
-            return Response(
-                {"error": "This short URL has been deactivated"},
-                status=status.HTTP_410_GONE
-            )
-        
-        if link.is_expired():
-            return Response(
-                {"error": "This short URL has expired"},
-                status=status.HTTP_410_GONE
-            )
-        
-        ip_address = get_client_ip(request)
-        user_agent = request.META.get('HTTP_USER_AGENT', '')
-        referrer = request.META.get('HTTP_REFERER', '')
+        reason = get_unavailable_reason(link)
+        if reason:
+            return Response({"error": reason}, status=status.HTTP_410_GONE)
         
-        ua_info = parse_user_agent(user_agent)
+        click_buffer.enqueue(build_click_record(request, link))
         
-        country = get_country_from_ip(ip_address)
-        
-        LinkClick.objects.create(
-            link=link,
-            ip_address=anonymize_ip(ip_address),
-            user_agent=user_agent,
-            referrer=referrer,
-            country=country,
-            device_type=ua_info.get('device_type', 'Unknown') if ua_info else 'Unknown'
-        )
-        
-        Link.objects.filter(id=link.id).update(click_count=F('click_count') + 1)
-        
-        return HttpResponseRedirect(link.long_url)
+        return build_redirect_response(link)
+
+async def link_redirect_async(request, short_code):
+    # Native async counterpart of LinkRedirectView for ASGI deployments. DRF
+    # views are sync-only, so errors are rendered with the same JSON bodies.
+    return await aserve_redirect(request, short_code)
 
 class LinkAnalyticsView(generics.RetrieveAPIView):
     serializer_class = LinkAnalyticsSerializer
@@ -110,34 +231,86 @@ class LinkAnalyticsView(generics.RetrieveAPIView):
         instance = self.get_object()
         serializer = self.get_serializer(instance)
         
-        thirty_days_ago = timezone.now() - timedelta(days=30)
+        serializer_data = serializer.data
+        serializer_data['clicks_by_day'] = clicks_by_day(instance)
+        serializer_data['clicks_by_country'] = clicks_by_country(instance)
+        serializer_data['clicks_by_device'] = clicks_by_device(instance)
+        by_day, total = unique_visitors(instance)
+        serializer_data['unique_visitors_by_day'] = by_day
+        serializer_data['unique_visitors'] = total
         
-        clicks_by_day = (
-            LinkClick.objects.filter(
-                link=instance, 
-                clicked_at__gte=thirty_days_ago
+        return Response(serializer_data)
+
+class AnalyticsSummaryView(APIView):
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly, HasAPIKeyOrIsAuthenticated]
+    default_days = 30
+    max_days = 365
+    max_top = 100
+
+    def get_int_param(self, name, default, maximum):
+        try:
+            value = int(self.request.query_params[name])
+        except (KeyError, ValueError):
+            return default
+        return max(1, min(value, maximum))
+
+    def get(self, request):
+        owner_id = request.user.id if request.user.is_authenticated else None
+        days = self.get_int_param('days', self.default_days, self.max_days)
+        top = self.get_int_param('top', settings.ANALYTICS_SUMMARY['TOP_LINKS'], self.max_top)
+        return Response(account_summary(owner_id, days=days, top=top))
+
+class LinkClickListView(generics.ListAPIView):
+    serializer_class = LinkClickSerializer
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly, HasAPIKeyOrIsAuthenticated]
+    pagination_class = ClickCursorPagination
+
+    def get_link_queryset(self):
+        if self.request.user.is_authenticated:
+            return Link.objects.filter(created_by=self.request.user)
+        return Link.objects.filter(created_by__isnull=True)
+
+    def get_queryset(self):
+        link = get_object_or_404(self.get_link_queryset(), short_code=self.kwargs['short_code'])
+        return LinkClick.objects.filter(link=link).select_related('user_agent', 'referrer')
+
+class LinkClickExportView(APIView):
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly, HasAPIKeyOrIsAuthenticated]
+    chunk_size = 2000
+
+    def get_link_queryset(self):
+        if self.request.user.is_authenticated:
+            return Link.objects.filter(created_by=self.request.user)
+        return Link.objects.filter(created_by__isnull=True)
+
+    def get(self, request, short_code):
+        fmt = request.query_params.get('fmt', 'csv')
+        if fmt not in EXPORT_CONTENT_TYPES:
+            return Response(
+                {"error": f"Unsupported export format. Choose one of: {', '.join(EXPORT_CONTENT_TYPES)}"},
+                status=status.HTTP_400_BAD_REQUEST
             )
-            .annotate(date=TruncDate('clicked_at'))
-            .values('date')
-            .annotate(count=Count('id'))
-            .order_by('date')
+
+        link = get_object_or_404(self.get_link_queryset(), short_code=short_code)
+        rows = iter_keyset(
+            LinkClick.objects.filter(link=link), CLICK_EXPORT_COLUMNS, self.chunk_size, key=('clicked_at', 'id')
         )
-        
-        clicks_by_country = LinkClick.objects.filter(
-            link=instance
-        ).exclude(country__isnull=True).values('country').annotate(
-            count=Count('id')
-        ).order_by('-count')
-        
-        clicks_by_device = LinkClick.objects.filter(
-            link=instance
-        ).exclude(device_type__isnull=True).values('device_type').annotate(
-            count=Count('id')
-        ).order_by('-count')
-        
-        serializer_data = serializer.data
-        serializer_data['clicks_by_day'] = list(clicks_by_day)
-        serializer_data['clicks_by_country'] = list(clicks_by_country)
-        serializer_data['clicks_by_device'] = list(clicks_by_device)
-        
-        return Response(serializer_data)
\ No newline at end of file
+
+        response = StreamingHttpResponse(
+            iter_export(fmt, iter_click_rows(rows), CLICK_EXPORT_FIELDS),
+            content_type=EXPORT_CONTENT_TYPES[fmt]
+        )
+        response['Content-Disposition'] = f'attachment; filename="{short_code}-clicks.{fmt}"'
+        return response
+
+def metrics_view(request):
+    # Per-view latency and cache internals are not for the public: without a
+    # token the endpoint stays closed unless METRICS_PUBLIC says otherwise.
+    token = settings.METRICS['AUTH_TOKEN']
+    if token:
+        keyword, _, presented = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+        if keyword.lower() != 'bearer' or not constant_time_compare(presented, token):
+            return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+    elif not settings.METRICS['PUBLIC']:
+        return HttpResponse(status=status.HTTP_403_FORBIDDEN)
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
\ No newline at end of file
@@ -0,0 +1,80 @@
+"""
+Sync (DRF APIView) vs native async redirect view under ASGI.
+
+    python -m benchmarks.redirect_async --requests 2000 --concurrency 50
+
+Both views are served by the same ASGI handler and middleware stack. Under
+ASGI the sync view runs through sync_to_async on Django's single
+thread-sensitive executor, so concurrent requests queue behind each other;
+the async view only leaves the event loop for the (cached) lookup.
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from benchmarks.harness import benchmark_database, emit, setup_django, summarize
+
+
+async def drive(client, paths, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(path):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.get(path)
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code == 302, response.status_code
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(path) for path in paths))
+    return latencies, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--links', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--no-cache', action='store_true',
+                        help="Bypass the resolution cache so every request hits the database.")
+    parser.add_argument('--output')
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from django.test import AsyncClient
+    from app.cache import link_cache
+    from app.ingest import click_buffer
+    from app.models import Link
+
+    if args.no_cache:
+        link_cache.alias = 'dummy'
+        link_cache.local.maxsize = 0
+
+    results = []
+    with benchmark_database():
+        codes = [
+            Link.objects.create(long_url=f'https://example.com/{i}').short_code
+            for i in range(args.links)
+        ]
+        rng = random.Random(0)
+        picks = [rng.choice(codes) for _ in range(args.requests)]
+        client = AsyncClient()
+        for view in ('sync', 'async'):
+            link_cache.clear()
+            paths = [f'/bench/{view}/r/{code}/' for code in picks]
+            latencies, elapsed = asyncio.run(drive(client, paths, args.concurrency))
+            click_buffer.flush()
+            results.append({'view': view, **summarize(latencies, elapsed)})
+
+    emit({
+        'benchmark': 'redirect_async',
+        'concurrency': args.concurrency,
+        'cache': not args.no_cache,
+        'results': results,
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+import itertools
+import random
+from datetime import timedelta
+
+COUNTRIES = ['ID', 'US', 'IN', 'DE', 'BR', 'JP', '']
+USER_AGENTS = [
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 Mobile/15E148',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/120.0 Safari/537.36',
+    'Mozilla/5.0 (Linux; Android 14; Pixel 8) AppleWebKit/537.36 Chrome/120.0 Mobile Safari/537.36',
+    'Mozilla/5.0 (iPad; CPU OS 17_0 like Mac OS X) AppleWebKit/605.1.15 Mobile/15E148',
+    'Googlebot/2.1 (+http://www.google.com/bot.html)',
+]
+
+
+class ZipfSampler:
+    """Draws ranks 0..n-1 with probability proportional to 1 / (rank + 1) ** exponent."""
+
+    def __init__(self, n, exponent=1.1, seed=0):
+        self.random = random.Random(seed)
+        self.cum_weights = list(itertools.accumulate(1 / (k ** exponent) for k in range(1, n + 1)))
+        self.population = range(n)
+
+    def sample(self, k):
+        return self.random.choices(self.population, cum_weights=self.cum_weights, k=k)
+
+
+def seed(links, clicks, owner=None, exponent=1.1, seed=0):
+    from django.utils import timezone
+    from app.analytics import rebuild_rollups
+    from app.dimensions import user_agents
+    from app.models import DeviceType, Link, LinkClick
+
+    rng = random.Random(seed)
+    created = [
+        Link.objects.create(long_url=f'https://example.com/page/{i}', created_by=owner, title=f'Link {i}')
+        for i in range(links)
+    ]
+    sampler = ZipfSampler(links, exponent, seed)
+    now = timezone.now()
+    ranks = sampler.sample(clicks)
+    user_agent_ids = list(user_agents.resolve(USER_AGENTS).values())
+    batch = []
+    for rank in ranks:
+        batch.append(LinkClick(
+            link=created[rank],
+            clicked_at=now - timedelta(seconds=rng.randrange(30 * 24 * 3600)),
+            ip_address=f'10.{rng.randrange(256)}.{rng.randrange(256)}.0',
+            user_agent_id=rng.choice(user_agent_ids),
+            country_code=rng.choice(COUNTRIES),
+            device_type=rng.choice(DeviceType.values),
+        ))
+        if len(batch) >= 5000:
+            LinkClick.objects.bulk_create(batch)
+            batch = []
+    LinkClick.objects.bulk_create(batch)
+
+    counts = {}
+    for rank in ranks:
+        counts[rank] = counts.get(rank, 0) + 1
+    for rank, count in counts.items():
+        Link.objects.filter(id=created[rank].id).update(click_count=count)
+        rebuild_rollups(created[rank])
+    return created, sampler
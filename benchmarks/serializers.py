@@ -0,0 +1,141 @@
+"""
+Rows per second of link listing and analytics payloads, before and after the
+fast serialization path.
+
+    python -m benchmarks.serializers --rows 1000 --repeat 20
+
+Serializes in-memory links with LinkSerializer and LinkReadSerializer, renders
+list, analytics and summary payloads with JSONRenderer and FastJSONRenderer,
+and drives GET /api/links/?page_size=<rows> through the test client with the
+old and new serializer/renderer pair.
+"""
+import argparse
+from datetime import timedelta
+from unittest import mock
+
+from benchmarks.harness import Timer, benchmark_database, emit, setup_django
+
+
+def best_of(repeat, func):
+    best = None
+    for _ in range(repeat):
+        with Timer() as timer:
+            func()
+        best = timer.elapsed if best is None else min(best, timer.elapsed)
+    return best
+
+
+def result(name, variant, rows, seconds):
+    return {
+        'case': name,
+        'variant': variant,
+        'rows': rows,
+        'seconds': round(seconds, 6),
+        'rows_per_second': round(rows / seconds, 1) if seconds else 0.0,
+    }
+
+
+def build_links(rows):
+    from django.utils import timezone
+    from app.models import Link
+
+    now = timezone.now()
+    return [
+        Link(
+            id=i + 1, short_code=f'code{i:06d}', long_url=f'https://example.com/page/{i}',
+            title=f'Link {i}', created_at=now - timedelta(minutes=i), updated_at=now,
+            expires_at=now + timedelta(days=30) if i % 3 else None, created_by_id=1,
+            click_count=i * 7, bot_click_count=i,
+        )
+        for i in range(rows)
+    ]
+
+
+def analytics_payload(days):
+    from django.utils import timezone
+
+    today = timezone.localdate()
+    return {
+        'short_code': 'code000001', 'long_url': 'https://example.com/page/1', 'click_count': 12345,
+        'clicks_by_day': [{'date': today - timedelta(days=d), 'count': d * 3} for d in range(days)],
+        'clicks_by_country': [{'country': f'Country {i}', 'count': 1000 - i} for i in range(200)],
+        'clicks_by_device': [{'device_type': name, 'count': 100} for name in ('Desktop', 'Mobile', 'Tablet')],
+        'unique_visitors_by_day': [{'date': today - timedelta(days=d), 'count': d} for d in range(days)],
+        'unique_visitors': 4321,
+    }
+
+
+def run_serializers(rows, repeat):
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+
+    from app.renderers import FastJSONRenderer
+    from app.serializers import LinkReadSerializer, LinkSerializer
+
+    links = build_links(rows)
+    context = {'request': Request(APIRequestFactory().get('/api/links/'))}
+    results = []
+    for variant, serializer_class in (('LinkSerializer', LinkSerializer), ('LinkReadSerializer', LinkReadSerializer)):
+        seconds = best_of(repeat, lambda: serializer_class(links, many=True, context=context).data)
+        results.append(result('serialize-links', variant, rows, seconds))
+
+    payloads = {
+        'render-links': (LinkSerializer(links, many=True, context=context).data, rows),
+        'render-analytics': (analytics_payload(rows), rows),
+    }
+    for name, (payload, count) in payloads.items():
+        for renderer in (JSONRenderer(), FastJSONRenderer()):
+            seconds = best_of(repeat, lambda: renderer.render(payload))
+            results.append(result(name, type(renderer).__name__, count, seconds))
+    return results
+
+
+def run_view(rows, repeat):
+    from django.contrib.auth.models import User
+    from django.test import Client
+    from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    from app.models import Link
+    from app.serializers import LinkSerializer
+    from app.views import LinkListCreateView
+
+    owner = User.objects.create_user('bench', 'bench@example.com', 'bench-password')
+    Link.objects.bulk_create(
+        Link(short_code=f'code{i:06d}', long_url=f'https://example.com/page/{i}', created_by=owner)
+        for i in range(rows)
+    )
+    client = Client(headers={'Authorization': f'Bearer {AccessToken.for_user(owner)}'})
+    path = f'/api/links/?page_size={rows}'
+
+    def fetch():
+        response = client.get(path)
+        assert response.status_code == 200, response.status_code
+
+    results = []
+    with mock.patch.object(LinkListCreateView, 'get_serializer_class', lambda self: LinkSerializer), \
+            mock.patch.object(LinkListCreateView, 'renderer_classes', [JSONRenderer, BrowsableAPIRenderer]):
+        results.append(result('view-links', 'LinkSerializer+JSONRenderer', rows, best_of(repeat, fetch)))
+    results.append(result('view-links', 'LinkReadSerializer+FastJSONRenderer', rows, best_of(repeat, fetch)))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--output', help="Write JSON results here instead of stdout.")
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from app.renderers import orjson
+
+    results = run_serializers(args.rows, args.repeat)
+    with benchmark_database():
+        results += run_view(args.rows, args.repeat)
+    emit({'benchmark': 'serializers', 'orjson': orjson is not None, 'results': results}, args.output)
+
+
+if __name__ == '__main__':
+    main()
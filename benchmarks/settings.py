@@ -0,0 +1,38 @@
+import os
+import tempfile
+
+# Benchmarks run offline: the production settings require these, so give them
+# harmless values when they aren't already provided by the environment.
+for name in ('SECRET_KEY', 'DB_NAME', 'DB_USER', 'DB_PASSWORD', 'DB_HOST', 'DB_PORT'):
+    os.environ.setdefault(name, 'benchmark')
+
+from config.settings import *  # noqa: E402,F401,F403
+from config.settings import env  # noqa: E402
+
+# BENCH_DATABASE_URL points the suite at a local MySQL stand-in; the default is
+# a throwaway SQLite file (not shared-cache :memory:, which fails with "table is
+# locked" as soon as a request thread and the click flusher overlap).
+DATABASES = {
+    'default': env.db('BENCH_DATABASE_URL', default='sqlite://:memory:'),
+}
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    DATABASES['default']['TEST'] = {
+        'NAME': os.path.join(tempfile.gettempdir(), 'url_shortener_bench.sqlite3'),
+    }
+    # IMMEDIATE transactions make concurrent writers wait on the busy timeout
+    # instead of failing on a read-to-write lock upgrade.
+    DATABASES['default']['OPTIONS'] = {'timeout': 30, 'transaction_mode': 'IMMEDIATE'}
+DATABASE_REPLICAS = []
+DEBUG = False
+ALLOWED_HOSTS = ['testserver', 'localhost']
+ROOT_URLCONF = 'benchmarks.urls'
+CACHES = {
+    **CACHES,
+    'dummy': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+}
+# Every benchmark client is 127.0.0.1, so the rate limits would turn most
+# requests into 429s.
+RATE_LIMITS = {
+    name: {**policy, 'CAPACITY': 0} if isinstance(policy, dict) else policy
+    for name, policy in RATE_LIMITS.items()
+}
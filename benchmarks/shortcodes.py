@@ -0,0 +1,52 @@
+"""
+Insert throughput of the short code strategies.
+
+    python -m benchmarks.shortcodes --count 5000
+"""
+import argparse
+
+from benchmarks.harness import Timer, benchmark_database, emit, setup_django
+
+
+def run_strategy(strategy, count, batch):
+    from django.test import override_settings
+    from app.models import Link
+    from app.shortcodes import _generators
+
+    conf = {
+        'STRATEGY': strategy,
+        'MAX_RETRIES': 5,
+        'OPTIONS': {'length': 8, 'block_size': 1000},
+    }
+    with override_settings(SHORT_CODE_GENERATOR=conf):
+        _generators.clear()
+        Link.objects.all().delete()
+        with Timer() as timer:
+            for i in range(count):
+                Link.objects.create(long_url=f'https://example.com/{batch}/{i}')
+    return {
+        'strategy': strategy,
+        'links': count,
+        'seconds': round(timer.elapsed, 4),
+        'inserts_per_second': round(count / timer.elapsed, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--count', type=int, default=2000)
+    parser.add_argument('--strategy', action='append', choices=['random', 'sequence'])
+    parser.add_argument('--output', help="Write JSON results here instead of stdout.")
+    args = parser.parse_args(argv)
+
+    setup_django()
+    with benchmark_database():
+        results = [
+            run_strategy(strategy, args.count, n)
+            for n, strategy in enumerate(args.strategy or ['random', 'sequence'])
+        ]
+    emit({'benchmark': 'shortcodes', 'results': results}, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+"""
+Load and micro-benchmarks for the redirect, create and analytics endpoints.
+
+    python -m benchmarks.suite --links 1000 --clicks 100000 --requests 2000 \
+        --concurrency 8 --output bench.json
+
+Seeds links with Zipf-distributed click popularity, then drives each scenario
+sequentially through the Django test client, concurrently through the WSGI
+handler (one client per thread) and concurrently through the ASGI handler.
+Queries per request come from MetricsMiddleware. ``redirect`` goes through
+RedirectFastPathMiddleware; ``redirect-full`` serves the same codes through
+LinkRedirectView and the whole middleware stack, for comparison.
+"""
+import argparse
+import asyncio
+import platform
+import resource
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.harness import benchmark_database, emit, setup_django, summarize
+from benchmarks.seed import seed
+
+SCENARIOS = ('redirect', 'redirect-full', 'create', 'analytics')
+DRIVERS = ('client', 'wsgi', 'asgi')
+
+
+class Scenario:
+    def __init__(self, name, links, sampler, token, counter):
+        self.name = name
+        self.links = links
+        self.sampler = sampler
+        self.headers = {'Authorization': f'Bearer {token}'}
+        self.counter = counter
+
+    def requests(self, count):
+        if self.name == 'create':
+            return [('post', '/api/links/', {'long_url': f'https://example.org/new/{next(self.counter)}'}, 201)
+                    for _ in range(count)]
+        codes = [self.links[rank].short_code for rank in self.sampler.sample(count)]
+        if self.name == 'redirect':
+            return [('get', f'/r/{code}/', None, 302) for code in codes]
+        if self.name == 'redirect-full':
+            return [('get', f'/bench/sync/r/{code}/', None, 302) for code in codes]
+        return [('get', f'/api/links/{code}/analytics/', None, 200) for code in codes]
+
+
+def call(client, request, headers):
+    method, path, data, expected = request
+    start = time.perf_counter()
+    if method == 'post':
+        response = client.post(path, data, content_type='application/json', headers=headers)
+    else:
+        response = client.get(path, headers=headers)
+    elapsed = time.perf_counter() - start
+    assert response.status_code == expected, (path, response.status_code)
+    return elapsed
+
+
+def run_client(scenario, requests, concurrency):
+    from django.test import Client
+
+    client = Client()
+    start = time.perf_counter()
+    latencies = [call(client, request, scenario.headers) for request in requests]
+    return latencies, time.perf_counter() - start
+
+
+def run_wsgi(scenario, requests, concurrency):
+    from django.test import Client
+
+    local = threading.local()
+
+    def one(request):
+        if not hasattr(local, 'client'):
+            local.client = Client()
+        return call(local.client, request, scenario.headers)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(one, requests))
+    return latencies, time.perf_counter() - start
+
+
+def run_asgi(scenario, requests, concurrency):
+    from django.test import AsyncClient
+
+    client = AsyncClient()
+
+    async def drive():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(request):
+            method, path, data, expected = request
+            async with semaphore:
+                begin = time.perf_counter()
+                if method == 'post':
+                    response = await client.post(path, data, content_type='application/json', headers=scenario.headers)
+                else:
+                    response = await client.get(path, headers=scenario.headers)
+                assert response.status_code == expected, (path, response.status_code)
+                return time.perf_counter() - begin
+
+        return await asyncio.gather(*(one(request) for request in requests))
+
+    start = time.perf_counter()
+    latencies = asyncio.run(drive())
+    return latencies, time.perf_counter() - start
+
+
+RUNNERS = {'client': run_client, 'wsgi': run_wsgi, 'asgi': run_asgi}
+
+
+def queries_per_request(before, after):
+    count = sum(c for c, _ in after.values()) - sum(c for c, _ in before.values())
+    queries = sum(q for _, q in after.values()) - sum(q for _, q in before.values())
+    return round(queries / count, 2) if count else 0.0
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if platform.system() == 'Darwin' else 1024), 1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--links', type=int, default=500)
+    parser.add_argument('--clicks', type=int, default=20000)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--zipf', type=float, default=1.1, help="Zipf exponent of link popularity.")
+    parser.add_argument('--scenario', action='append', choices=SCENARIOS)
+    parser.add_argument('--driver', action='append', choices=DRIVERS)
+    parser.add_argument('--output', help="Write JSON results here instead of stdout.")
+    args = parser.parse_args(argv)
+
+    setup_django()
+    import itertools
+
+    import django
+    from django.contrib.auth.models import User
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    from app.cache import link_cache
+    from app.ingest import click_buffer
+    from app.metrics import REQUEST_DB_QUERIES
+
+    results = []
+    with benchmark_database():
+        owner = User.objects.create_user('bench', 'bench@example.com', 'bench-password')
+        token = str(AccessToken.for_user(owner))
+        with_seed = time.perf_counter()
+        links, sampler = seed(args.links, args.clicks, owner=owner, exponent=args.zipf)
+        seed_seconds = time.perf_counter() - with_seed
+        counter = itertools.count()
+
+        for name in args.scenario or SCENARIOS:
+            for driver in args.driver or DRIVERS:
+                scenario = Scenario(name, links, sampler, token, counter)
+                requests = scenario.requests(args.requests)
+                link_cache.clear()
+                before = REQUEST_DB_QUERIES.totals()
+                latencies, elapsed = RUNNERS[driver](scenario, requests, args.concurrency)
+                after = REQUEST_DB_QUERIES.totals()
+                click_buffer.flush()
+                results.append({
+                    'scenario': name,
+                    'driver': driver,
+                    'concurrency': 1 if driver == 'client' else args.concurrency,
+                    **summarize(latencies, elapsed),
+                    'queries_per_request': queries_per_request(before, after),
+                    'peak_rss_mb': peak_rss_mb(),
+                })
+
+    emit({
+        'benchmark': 'suite',
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'params': {
+            'links': args.links,
+            'clicks': args.clicks,
+            'requests': args.requests,
+            'zipf': args.zipf,
+            'seed_seconds': round(seed_seconds, 2),
+        },
+        'results': results,
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
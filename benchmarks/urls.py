@@ -0,0 +1,11 @@
+from django.urls import path
+
+from app.views import LinkRedirectView, link_redirect_async
+from config.urls import urlpatterns as project_urlpatterns
+
+# Both redirect implementations side by side, so they can be compared under
+# the same load regardless of ASYNC_REDIRECT.
+urlpatterns = [
+    path('bench/sync/r/<str:short_code>/', LinkRedirectView.as_view()),
+    path('bench/async/r/<str:short_code>/', link_redirect_async),
+] + project_urlpatterns
@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_asgi_application()
+
+# No-op unless LINK_EXPIRY_SWEEP_INTERVAL is set.
+from app.sweeper import expiry_sweeper  # noqa: E402
+
+expiry_sweeper.start()
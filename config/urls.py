@@ -1,5 +1,8 @@
+from django.conf import settings
 from django.urls import path
-from app.views import RegisterView, Login, RefreshToken, LinkListCreateView, LinkDetailView, LinkRedirectView, LinkAnalyticsView
+from app.views import RegisterView, Login, RefreshToken, LinkListCreateView, LinkBatchView, LinkDetailView, LinkRedirectView, LinkAnalyticsView, LinkClickListView, LinkClickExportView, AnalyticsSummaryView, link_redirect_async, metrics_view
+
+redirect_view = link_redirect_async if settings.ASYNC_REDIRECT else LinkRedirectView.as_view()
 
 urlpatterns = [
     path('api/register/', RegisterView.as_view(), name='register'),
@@ -7,7 +10,13 @@ urlpatterns = [
     path('api/token/refresh/', RefreshToken.as_view(), name='token_refresh'),
 
     path('api/links/', LinkListCreateView.as_view(), name='link-list-create'),
+    path('api/links/batch/', LinkBatchView.as_view(), name='link-batch'),
     path('api/links/<str:short_code>/', LinkDetailView.as_view(), name='link-detail'),
     path('api/links/<str:short_code>/analytics/', LinkAnalyticsView.as_view(), name='link-analytics'),
-    path('r/<str:short_code>/', LinkRedirectView.as_view(), name='link-redirect'),
+    path('api/links/<str:short_code>/clicks/', LinkClickListView.as_view(), name='link-clicks'),
+    path('api/links/<str:short_code>/clicks/export/', LinkClickExportView.as_view(), name='link-clicks-export'),
+    path('api/analytics/summary/', AnalyticsSummaryView.as_view(), name='analytics-summary'),
+    path('r/<str:short_code>/', redirect_view, name='link-redirect'),
+    # No trailing slash: /metrics is the path Prometheus scrapes by default.
+    path('metrics', metrics_view, name='metrics'),
 ]
\ No newline at end of file